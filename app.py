@@ -223,65 +223,193 @@
 
 # app.py - Main application file for Azure deployment
 
-from fastapi import FastAPI, HTTPException
+import time
+IMPORT_START = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import json
 import os
 import uvicorn
 from dotenv import load_dotenv
 
-# Import backend modules
-from backend.retriever import load_graph, embed_nodes, get_top_nodes
-from backend.openai_interface import ask_openai
-from backend.web_scraper import scrape_web, get_fallback_nestle_urls
+# Import backend modules (heavy dependencies such as torch, sentence_transformers,
+# networkx and bs4 are imported lazily by these modules on first use)
+from backend.retriever import load_graph, load_node_index, build_node_index, get_top_nodes, encode_query_async, get_model, embedding_batcher
+from backend.openai_interface import ask_openai_async, ask_openai_stream, is_fallback_response, get_fallback_response
+from backend.web_scraper import scrape_web_async, get_fallback_nestle_urls
+from backend.http_client import close_async_client
+from backend.llm_client import llm_client
+from backend.search_cache import search_cache
+from backend.answer_cache import answer_cache
+from backend.graph_store import graph_exists
+from backend.graph_rank import GRAPH_RERANK_ENABLED, warm_up_ranking
+from backend.metrics import registry, callback_metric, timed_stage, STAGE_SECONDS, REQUEST_SECONDS, FALLBACKS, CONTENT_TYPE
+from backend.latency_budget import LatencyBudget, GRAPH_BUDGET_SHARE, SEARCH_BUDGET_SHARE
+from backend.single_flight import SingleFlight, question_key, CHAT_COALESCING_ENABLED
+from backend.process_pool import compute_pool
+from backend.context_builder import assemble_context, load_encoding
+from backend.structured_logging import setup_logging, shutdown_logging, get_logger, preview, new_request_id, request_id_var, dropped_records
 
 # Load environment variables
 load_dotenv()
+setup_logging()
+
+logger = get_logger("app")
 
-# ----- Azure-compatible startup: Create graph/log folders and build graph if needed -----
+# ----- Azure-compatible startup: Create graph/log folders -----
 GRAPH_DIR = "graph"
 LOG_DIR = "logs"
-GRAPH_FILE = os.path.join(GRAPH_DIR, "graph.pkl")
+GRAPH_FILE = os.path.join(GRAPH_DIR, "graph.db")
 
 os.makedirs(GRAPH_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
-
-if not os.path.exists(GRAPH_FILE):
-    print("📊 graph.pkl not found — building knowledge graph...")
-    try:
-        from backend.graph_builder import build_graph
-        build_graph()
-        print("✅ Knowledge graph built successfully.")
-    except Exception as e:
-        print(f"❌ Error building graph: {e}")
-else:
-    print("✅ graph.pkl already exists — skipping build.")
-# ------------------------------------------------------------------------------------------
+# ---------------------------------------------------------------
 
 app = FastAPI(title="Nestlé AI Chatbot", version="1.0.0")
 
 # Global variables
 G = None
 node_embeddings = None
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the application on startup"""
-    global G, node_embeddings
-    print("🚀 Starting Nestlé AI Chatbot...")
+# Set once the background warm-up has loaded the graph, index and encoder;
+# if it failed instead, warmup_error says why and /chat uses the fallbacks
+ready = False
+warmup_error = None
+startup_timings = {"app_import": round(time.perf_counter() - IMPORT_START, 3)}
+warmup_task = None
+
+def warm_up():
+    """
+    Load the prompt tokenizer, then build/load the graph, the node index and the query encoder.
+    Runs in a worker thread after the server is already accepting requests;
+    until it finishes /chat answers from the fallback context.
+    """
+    global G, node_embeddings, ready, warmup_error
+    warmup_start = time.perf_counter()
+
+    def record(stage, start):
+        startup_timings[stage] = round(time.perf_counter() - start, 3)
+
+    # First, and outside the graph try: requests arriving meanwhile estimate
+    # token counts rather than wait for the encoding
+    start = time.perf_counter()
+    load_encoding()
+    record("tokenizer_load", start)
 
     try:
+        start = time.perf_counter()
+        if not graph_exists():
+            print("📊 Knowledge graph not found — building knowledge graph...")
+            from backend.graph_builder import build_graph
+            build_graph()
+            record("graph_build", start)
+            start = time.perf_counter()
+
         print("📥 Loading knowledge graph and embeddings...")
-        G = load_graph()
-        node_embeddings = embed_nodes(G)
+        graph = load_graph()
+        record("graph_load", start)
+
+        # Build the PageRank operator now rather than on the first query
+        if GRAPH_RERANK_ENABLED:
+            start = time.perf_counter()
+            warm_up_ranking(graph)
+            record("graph_operator", start)
+
+        # Workers share the memory-mapped index written by the graph build step;
+        # only build it here if it is missing or stale
+        start = time.perf_counter()
+        embeddings = load_node_index(graph) or build_node_index(graph)
+        record("node_index", start)
+
+        # Queries need the encoder even when the index came from disk; with a
+        # compute pool it is loaded in the children that encode the queries
+        start = time.perf_counter()
+        if compute_pool.enabled and compute_pool.start():
+            record("compute_pool", start)
+        else:
+            if get_model() is None:
+                raise RuntimeError("query encoder failed to load")
+            record("encoder_load", start)
+
+        # Publish only now: a request that sees the graph must also find the
+        # encoder loaded, or it would load it on the request path
+        G, node_embeddings = graph, embeddings
+        ready = True
         print(f"✅ Graph loaded with {G.number_of_nodes()} nodes")
     except Exception as e:
+        warmup_error = str(e) or type(e).__name__
         print(f"❌ Failed to load graph/embeddings: {e}")
-        G = None
-        node_embeddings = None
 
-    print("🎉 Chatbot startup complete!")
+    record("warmup_total", warmup_start)
+    breakdown = ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in startup_timings.items())
+    print(f"⏱️ Startup breakdown: {breakdown}")
+    if ready:
+        print("🎉 Chatbot warm-up complete!")
+    else:
+        print("⚠️ Chatbot warm-up failed; answering from the fallback context")
+
+@app.on_event("startup")
+async def startup_event():
+    """Start serving immediately and warm up the heavy components in the background"""
+    global warmup_task
+    print("🚀 Starting Nestlé AI Chatbot...")
+    warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled outbound connections, stop the compute pool and cache watcher, and flush queued log records"""
+    await close_async_client()
+    await llm_client.close()
+    compute_pool.shutdown()
+    if answer_cache:
+        answer_cache.close()
+    shutdown_logging()
+
+# ----- Metrics -----
+CACHES = {"search": search_cache, "answer": answer_cache}
+
+def cache_stat(name):
+    """Callback reading one stats() field from every enabled cache"""
+    return lambda: [({"cache": cache_name}, cache.stats()[name]) for cache_name, cache in CACHES.items() if cache]
+
+callback_metric("nestle_cache_hits_total", "Cache lookups that hit", cache_stat("hits"), "counter")
+callback_metric("nestle_cache_misses_total", "Cache lookups that missed", cache_stat("misses"), "counter")
+callback_metric("nestle_cache_hit_ratio", "Cache hit rate since startup", cache_stat("hit_rate"))
+callback_metric("nestle_cache_entries", "Live entries per cache", cache_stat("size"))
+callback_metric("nestle_ready", "1 once warm-up has succeeded", lambda: [({}, int(ready))])
+callback_metric("nestle_graph_nodes", "Nodes in the loaded knowledge graph",
+                lambda: [({}, G.number_of_nodes() if G else 0)])
+callback_metric("nestle_log_dropped_total", "Log records dropped because the log queue was full",
+                lambda: [({}, dropped_records())], "counter")
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """
+    Time every request by its route template, keeping label cardinality
+    bounded, and tag its log records with a request id (the caller's
+    X-Request-ID when given, echoed back on the response)
+    """
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        request_id_var.reset(token)
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status
+        )
 
 # ----- API Models -----
 class Query(BaseModel):
@@ -290,88 +418,303 @@ class Query(BaseModel):
 # ----- Endpoints -----
 @app.get("/health")
 def health_check():
+    """Liveness: answers as soon as the process is up, even during warm-up"""
     return {
         "status": "healthy",
+        "ready": ready,
         "graph_loaded": G is not None,
         "nodes_count": G.number_of_nodes() if G else 0,
-        "environment": os.getenv("ENVIRONMENT", "development")
+        "environment": os.getenv("ENVIRONMENT", "development"),
+        "search_cache": search_cache.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "coalescing": {"chat": chat_flights.stats(), "stream_context": context_flights.stats()},
+        "embedding_batcher": embedding_batcher.stats() if embedding_batcher else None,
+        "compute_pool": compute_pool.stats() if compute_pool.enabled else None,
+        "llm": llm_client.stats()
     }
 
-@app.post("/chat")
-def chat(query: Query):
-    try:
-        print(f"[DEBUG] Received query: {query.question}")
-        graph_context = ""
-
-        if G and node_embeddings:
-            try:
-                top_nodes = get_top_nodes(query.question, G, node_embeddings, k=5)
-                graph_context = "\n".join([
-                    f"**{node}**: {G.nodes[node]['description']}"
-                    for node in top_nodes if node in G.nodes
-                ])
-                print(f"[DEBUG] Top graph nodes: {top_nodes}")
-            except Exception as e:
-                print(f"[DEBUG] Error using graph: {e}")
-                graph_context = get_basic_nestle_context(query.question)
-        else:
-            graph_context = get_basic_nestle_context(query.question)
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage/request histograms, fallback and cache counters"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
 
-        try:
-            web_results = scrape_web(query.question, num_results=5)
-            print(f"[DEBUG] Web results found: {len(web_results)}")
-            if not web_results:
-                web_results = get_fallback_nestle_urls(query.question)
-        except Exception as e:
-            print(f"[DEBUG] Scraper failed: {e}")
-            web_results = get_fallback_nestle_urls(query.question)
+@app.get("/ready")
+def readiness_check():
+    """Readiness: 503 until the graph, node index and encoder are loaded, or if warm-up failed"""
+    body = {
+        "ready": ready,
+        "graph_loaded": G is not None,
+        "warmup_error": warmup_error,
+        "startup_timings": startup_timings
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+# Upper bounds (seconds) for the two context sources gathered before the LLM
+# call; each also gets no more than its share of the request's latency budget
+GRAPH_TIMEOUT = float(os.getenv("GRAPH_TIMEOUT", "3"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "5"))
+
+def server_timing_header(timings):
+    """Stage timings as a Server-Timing header value (durations in milliseconds)"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+async def get_graph_context(question, query_emb, budget):
+    """
+    (name, description) of the top graph nodes for the question, most
+    relevant first, run off the event loop within its budget slice
+    """
+    if not (ready and G and node_embeddings):
+        budget.degrade("graph", "unavailable")
+        return get_basic_nestle_context(question)
+
+    timeout = budget.slice(GRAPH_BUDGET_SHARE, GRAPH_TIMEOUT)
+    try:
+        top_nodes = await asyncio.wait_for(
+            asyncio.to_thread(get_top_nodes, question, G, node_embeddings, 5, query_emb),
+            timeout=timeout
+        )
+        logger.debug("Top graph nodes", extra={"nodes": top_nodes})
+        return [(node, G.nodes[node].get("description", "")) for node in top_nodes if node in G.nodes]
+    except asyncio.TimeoutError:
+        budget.degrade("graph", f"exceeded {timeout:.2f}s")
+        return get_basic_nestle_context(question)
+    except Exception:
+        logger.exception("Error using graph")
+        budget.degrade("graph", "error")
+        return get_basic_nestle_context(question)
+
+async def get_web_results(question, budget):
+    """Nestlé URLs for the question from the async scraper, within its budget slice"""
+    timeout = budget.slice(SEARCH_BUDGET_SHARE, SEARCH_TIMEOUT)
+    try:
+        # The scraper drops sites that miss the deadline and keeps partial results;
+        # the outer timeout only guards against a hang while it cleans up
+        web_results = await asyncio.wait_for(
+            scrape_web_async(question, num_results=5, deadline=timeout),
+            timeout=timeout + 1
+        )
+        logger.debug("Web results found", extra={"results": len(web_results)})
+        if web_results:
+            return web_results
+        budget.degrade("search", "no results")
+    except asyncio.TimeoutError:
+        budget.degrade("search", f"exceeded {timeout:.2f}s")
+    except Exception:
+        logger.exception("Scraper failed")
+        budget.degrade("search", "error")
+    return get_fallback_nestle_urls(question)
+
+async def embed_question(question):
+    """Embed the question once; it serves both the answer cache and graph retrieval"""
+    # Never load the encoder on the request path; warm-up owns that
+    if not ready or not (answer_cache or node_embeddings):
+        return None
 
-        web_context = "\n".join([f"- {url}" for url in web_results]) if web_results else ""
+    try:
+        return await encode_query_async(question)
+    except Exception:
+        logger.exception("Query embedding failed")
+        return None
+
+async def gather_context(question, query_emb, budget, timings=None):
+    """Build the LLM context, returning it with the source URLs shown to the user"""
+    async def retrieve():
+        with timed_stage("retrieve", timings):
+            return await get_graph_context(question, query_emb, budget)
+
+    async def search():
+        with timed_stage("search", timings):
+            return await get_web_results(question, budget)
+
+    # Graph retrieval and web search run concurrently; the LLM call starts
+    # as soon as both have returned or hit their deadlines
+    graph_nodes, web_results = await asyncio.gather(retrieve(), search())
+
+    # Fit the most relevant node text and the URLs into the prompt token budget
+    with timed_stage("context", timings):
+        full_context = assemble_context(question, graph_nodes, web_results)
+    return full_context, web_results or []
+
+# Concurrent requests with the same normalized question share one
+# retrieval, search and LLM call instead of each running their own
+chat_flights = SingleFlight("chat", enabled=CHAT_COALESCING_ENABLED)
+# Streams cannot share tokens, but can share the context gathered for them
+context_flights = SingleFlight("stream_context", enabled=CHAT_COALESCING_ENABLED)
+
+async def answer_question(question, query_emb, budget):
+    """
+    Context, LLM answer and cache store for a question within the request's
+    latency budget. Returns the answer, sources, stage timings and the
+    stages that fell back to a degraded result.
+    """
+    timings = {}
+    full_context, web_results = await gather_context(question, query_emb, budget, timings)
+
+    # The LLM gets whatever the context stages left of the budget. The client
+    # enforces it; the outer timeout (plus the response reserve, which is
+    # still inside the budget) only guards against a hang
+    timeout = budget.remaining()
+    try:
+        if timeout <= 0:
+            # Nothing left to spend; a zero timeout would mean none to the client
+            raise asyncio.TimeoutError
+        with timed_stage("llm", timings):
+            answer = await asyncio.wait_for(
+                ask_openai_async(question, full_context, timeout=timeout),
+                timeout=timeout + budget.reserve
+            )
+        if is_fallback_response(question, answer):
+            budget.degrade("llm", "error")
+    except asyncio.TimeoutError:
+        FALLBACKS.inc(kind="llm_answer")
+        budget.degrade("llm", f"exceeded {timeout:.2f}s")
+        answer = get_fallback_response(question)
+    except Exception:
+        logger.exception("AI fallback triggered")
+        budget.degrade("llm", "error")
+        answer = get_emergency_fallback_response(question)
+
+    # Answers built on fallbacks are not worth serving again from the cache
+    if answer_cache and not budget.degraded:
+        answer_cache.store(query_emb, question, answer, web_results)
+
+    return answer, web_results, timings, list(budget.degraded)
 
-        full_context = f"""NESTLÉ KNOWLEDGE BASE:
-{graph_context}
+@app.post("/chat")
+async def chat(query: Query, response: Response):
+    # Per-stage durations, returned in the Server-Timing header
+    timings = {}
+    budget = LatencyBudget()
+    degraded = []
+    try:
+        logger.info("Received query", extra={"query": preview(query.question)})
+
+        with timed_stage("total", timings):
+            with timed_stage("embed", timings):
+                query_emb = await embed_question(query.question)
+            cached = None
+            if answer_cache:
+                with timed_stage("cache", timings):
+                    cached = answer_cache.lookup(query_emb)
+
+            if cached:
+                answer, web_results = cached
+            else:
+                # A coalesced request shares the first request's budget and outcome
+                answer, web_results, shared_timings, degraded = await chat_flights.run(
+                    question_key(query.question),
+                    lambda: answer_question(query.question, query_emb, budget)
+                )
+                # Coalesced requests report the stages of the call they joined
+                timings.update(shared_timings)
+
+        response.headers["Server-Timing"] = server_timing_header(timings)
+        return {
+            "answer": answer,
+            "sources": web_results,
+            "degraded": degraded
+        }
 
-RELEVANT NESTLÉ WEBSITES:
-{web_context}
+    except Exception as e:
+        logger.exception("Chat failed")
+        raise HTTPException(status_code=500, detail=str(e))
 
-QUERY CONTEXT: The user is asking about: {query.question}
-Please provide a response specifically focused on Nestlé Canada products, services, and information."""
+def stream_event(event_type, **fields):
+    """One NDJSON line of the /chat/stream protocol"""
+    return json.dumps({"type": event_type, **fields}, ensure_ascii=False) + "\n"
+
+@app.post("/chat/stream")
+async def chat_stream(query: Query):
+    """
+    Streaming variant of /chat as newline-delimited JSON: a "sources" event
+    first, then "token" events as the completion arrives, then "done" with
+    the stages that degraded. The latency budget bounds the context stages;
+    once tokens flow the client sees progress, so the stream is not cut off.
+    """
+    async def events():
+        logger.info("Received streaming query", extra={"query": preview(query.question)})
+        budget = LatencyBudget()
+
+        async def stream_context():
+            full_context, web_results = await gather_context(query.question, query_emb, budget)
+            return full_context, web_results, list(budget.degraded)
 
         try:
-            answer = ask_openai(query.question, full_context)
+            with timed_stage("embed"):
+                query_emb = await embed_question(query.question)
+            with timed_stage("cache"):
+                cached = answer_cache.lookup(query_emb) if answer_cache else None
+            if cached:
+                answer, sources = cached
+                yield stream_event("sources", sources=sources)
+                yield stream_event("token", content=answer)
+                yield stream_event("done", degraded=[])
+                return
+
+            full_context, web_results, degraded = await context_flights.run(
+                question_key(query.question), stream_context
+            )
+            yield stream_event("sources", sources=web_results)
+        except Exception:
+            logger.exception("Chat stream failed")
+            yield stream_event("sources", sources=[])
+            yield stream_event("token", content=get_emergency_fallback_response(query.question))
+            yield stream_event("done", degraded=["graph", "search", "llm"])
+            return
+
+        parts = []
+        llm_start = time.perf_counter()
+        try:
+            with timed_stage("llm"):
+                async for token in ask_openai_stream(query.question, full_context):
+                    if not parts:
+                        STAGE_SECONDS.observe(time.perf_counter() - llm_start, stage="llm_first_token")
+                    parts.append(token)
+                    yield stream_event("token", content=token)
         except Exception as e:
-            print(f"[DEBUG] AI fallback triggered: {e}")
-            answer = get_emergency_fallback_response(query.question)
+            logger.warning("AI stream interrupted", extra={"error": str(e), "streamed_tokens": len(parts)})
+            degraded = degraded + ["llm"]
+            if not parts:
+                yield stream_event("token", content=get_emergency_fallback_response(query.question))
+        else:
+            answer = "".join(parts)
+            if is_fallback_response(query.question, answer):
+                degraded = degraded + ["llm"]
+            elif answer_cache and answer and not degraded:
+                answer_cache.store(query_emb, query.question, answer, web_results)
 
-        return {
-            "answer": answer,
-            "sources": web_results or []
-        }
+        yield stream_event("done", degraded=degraded)
 
-    except Exception as e:
-        print(f"[ERROR] Chat failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        # Ask reverse proxies not to buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ----- Fallback context -----
 def get_basic_nestle_context(query):
+    """Hand-written (name, description) context for when the graph cannot answer"""
+    FALLBACKS.inc(kind="graph_context")
     query_lower = query.lower()
-    context = "**Nestlé Canada**: Leading food and beverage company with brands like KitKat, Smarties, Aero, Coffee-mate, and Quality Street.\n"
+    context = [("Nestlé Canada", "Leading food and beverage company with brands like KitKat, Smarties, Aero, Coffee-mate, and Quality Street.")]
 
     if any(w in query_lower for w in ["chocolate", "candy", "sweet"]):
-        context += "**Chocolate Brands**: KitKat, Smarties, Aero, Quality Street.\n"
+        context.append(("Chocolate Brands", "KitKat, Smarties, Aero, Quality Street."))
     if any(w in query_lower for w in ["coffee", "beverage", "drink"]):
-        context += "**Beverages**: Nespresso, Coffee-mate, Carnation hot chocolate.\n"
+        context.append(("Beverages", "Nespresso, Coffee-mate, Carnation hot chocolate."))
     if any(w in query_lower for w in ["nutrition", "baby", "health"]):
-        context += "**Nutrition**: Gerber baby food, Carnation evaporated milk.\n"
+        context.append(("Nutrition", "Gerber baby food, Carnation evaporated milk."))
     if any(w in query_lower for w in ["sustainability", "environment"]):
-        context += "**Sustainability**: Cocoa sourcing, water stewardship, carbon reduction.\n"
+        context.append(("Sustainability", "Cocoa sourcing, water stewardship, carbon reduction."))
     if any(w in query_lower for w in ["christmas", "holiday", "gift"]):
-        context += "**Holiday Products**: Advent calendars, gift tins, seasonal treats.\n"
+        context.append(("Holiday Products", "Advent calendars, gift tins, seasonal treats."))
 
-    context += "**Values**: Good Food, Good Life philosophy, quality ingredients, Canadian made."
+    context.append(("Values", "Good Food, Good Life philosophy, quality ingredients, Canadian made."))
     return context
 
 def get_emergency_fallback_response(query):
+    FALLBACKS.inc(kind="emergency_answer")
     return """Hello! I'm your Nestlé Canada assistant.
 I can help with products like KitKat, Aero, Smarties, Coffee-mate, and more.
 Visit madewithnestle.ca to explore recipes, brands, and where to buy!
@@ -0,0 +1,155 @@
+# backend/answer_cache.py
+
+import os
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+from backend.graph_store import GRAPH_DB_PATH, read_graph_version
+from backend.structured_logging import get_logger, preview
+
+load_dotenv()
+
+logger = get_logger("answer_cache")
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "1800"))
+# How often (seconds) to check the graph store for changes
+ANSWER_CACHE_GRAPH_CHECK_INTERVAL = float(os.getenv("ANSWER_CACHE_GRAPH_CHECK_INTERVAL", "5"))
+
+class SemanticAnswerCache:
+    """
+    Bounded cache of LLM answers keyed by question embedding. A lookup hits
+    when the cosine similarity to a cached question reaches the threshold.
+    Entries expire after a TTL and the whole cache is dropped when the
+    knowledge graph changes, since cached answers were built from it. The
+    graph store is polled on a background thread; lookups only compare an
+    in-memory generation counter, so they never touch the disk.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_entries=ANSWER_CACHE_SIZE,
+                 ttl=ANSWER_CACHE_TTL, graph_path=GRAPH_DB_PATH,
+                 check_interval=ANSWER_CACHE_GRAPH_CHECK_INTERVAL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.graph_path = graph_path
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._graph_version = self._read_graph_version()
+        # Bumped by the watcher thread when the graph changes; the cache is
+        # reset on the next lookup or store that sees a new value
+        self._generation = 0
+        self._seen_generation = 0
+        self._watcher = None
+        self._stop = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        """Drop all entries (caller holds the lock or is in __init__)"""
+        self._vectors = None
+        self._entries = [None] * self.max_entries
+        self._expires = np.zeros(self.max_entries)
+        self._last_used = np.zeros(self.max_entries)
+
+    def _read_graph_version(self):
+        """Graph store write counter, plus its inode so a rebuilt file is noticed too"""
+        try:
+            if not os.path.exists(self.graph_path):
+                return None
+            return os.stat(self.graph_path).st_ino, read_graph_version(self.graph_path)
+        except Exception:
+            return None
+
+    def _watch_graph(self):
+        """Poll the graph store version until close(); runs on the watcher thread"""
+        while not self._stop.wait(self.check_interval):
+            version = self._read_graph_version()
+            if version != self._graph_version:
+                self._graph_version = version
+                self._generation += 1
+
+    def _check_graph_version(self):
+        """Invalidate everything if the watcher saw the graph change (caller holds the lock)"""
+        if self._watcher is None:
+            # Started on first use so that importing the module spawns no thread
+            self._watcher = threading.Thread(target=self._watch_graph, name="answer-cache-graph-watch", daemon=True)
+            self._watcher.start()
+        if self._generation != self._seen_generation:
+            logger.info("Knowledge graph changed, clearing answer cache")
+            self._seen_generation = self._generation
+            self._reset()
+
+    def close(self):
+        """Stop the graph watcher thread"""
+        self._stop.set()
+
+    def lookup(self, query_emb):
+        """Return (answer, sources) for the most similar live question, or None"""
+        if query_emb is None:
+            return None
+
+        with self._lock:
+            self._check_graph_version()
+            if self._vectors is None:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            scores = self._vectors @ query_emb
+            scores[self._expires <= now] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = now
+            self.hits += 1
+            question, answer, sources = self._entries[best]
+            logger.info("Answer cache hit", extra={"similarity": round(float(scores[best]), 4), "cached_question": preview(question)})
+            return answer, list(sources)
+
+    def store(self, query_emb, question, answer, sources):
+        """Cache an answer, replacing an expired or the least recently used slot"""
+        if query_emb is None:
+            return
+
+        with self._lock:
+            self._check_graph_version()
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(query_emb)), dtype=np.float32)
+
+            now = time.time()
+            # Expired and never-used slots have the oldest timestamps, so they go first
+            recency = np.where(self._expires <= now, -np.inf, self._last_used)
+            slot = int(np.argmin(recency))
+
+            self._vectors[slot] = query_emb
+            self._entries[slot] = (question, answer, list(sources))
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": int(np.count_nonzero(self._expires > time.time())),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+            }
+
+answer_cache = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
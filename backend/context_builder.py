@@ -0,0 +1,147 @@
+# backend/context_builder.py
+
+import math
+import os
+import re
+import threading
+from dotenv import load_dotenv
+
+from backend.metrics import histogram
+from backend.openai_interface import build_messages
+from backend.search_cache import normalize_query
+from backend.structured_logging import get_logger
+
+load_dotenv()
+
+logger = get_logger("context")
+
+# Tokens the whole prompt (system message, question and context) may use
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+# tiktoken encoding that counts the tokens; if it cannot be loaded they are estimated
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "cl100k_base")
+# tiktoken downloads encodings into a temp directory by default; keep them
+# next to the graph instead, where startup.sh fetches them at deploy time
+TIKTOKEN_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR", os.path.join("graph", "tiktoken"))
+# Characters per token for the estimate (English text averages about 4)
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "3.5"))
+
+# Chat formatting adds a few tokens around every message, plus the reply primer
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+PROMPT_TOKENS = histogram(
+    "nestle_prompt_tokens", "Tokens in the prompt sent to the LLM",
+    buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 8000))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# tiktoken is imported by load_encoding at warm-up, never from a request
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+def load_encoding():
+    """
+    Load the tiktoken encoding (reading or downloading its cache file) and
+    return it, or None if it cannot be loaded. Call from warm-up or scripts.
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                # tiktoken only takes its cache directory from the environment
+                os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+                os.makedirs(os.environ["TIKTOKEN_CACHE_DIR"], exist_ok=True)
+                _encoding = tiktoken.get_encoding(PROMPT_TOKENIZER)
+                print(f"✅ Prompt tokenizer {PROMPT_TOKENIZER} loaded")
+            except Exception as e:
+                print(f"⚠️ tiktoken unavailable ({e}), estimating prompt tokens from length")
+            _encoding_loaded = True
+    return _encoding
+
+def get_encoding():
+    """The encoding if load_encoding has finished, else None; never loads or blocks"""
+    return _encoding
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if not text:
+        return 0
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def count_message_tokens(messages):
+    """Tokens a list of chat messages costs as a prompt"""
+    return sum(TOKENS_PER_MESSAGE + count_tokens(m["content"]) for m in messages) + TOKENS_PER_REPLY
+
+def split_sentences(text):
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+def build_full_context(question, graph_context, web_context):
+    """The context block handed to the LLM, from already formatted graph and website lines"""
+    return f"""NESTLÉ KNOWLEDGE BASE:
+{graph_context}
+
+RELEVANT NESTLÉ WEBSITES:
+{web_context}
+
+QUERY CONTEXT: The user is asking about: {question}
+Please provide a response specifically focused on Nestlé Canada products, services, and information."""
+
+def assemble_context(question, nodes, web_results, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Fill the prompt up to budget tokens. nodes are (name, description)
+    pairs, most relevant first; each is kept whole, cut after its last
+    sentence that fits, or dropped. Sentences already given by a more
+    relevant node (overlapping chunks, repeated boilerplate) are skipped.
+    Website lines go in first: they are short and the answer cites them.
+    Until warm-up has loaded the tokenizer, tokens are estimated from length.
+    """
+    frame = count_message_tokens(build_messages(question, build_full_context(question, "", "")))
+    remaining = budget - frame
+    usage = {"budget": budget, "nodes_total": len(nodes), "nodes_used": 0,
+             "truncated": 0, "duplicate_sentences": 0, "urls_used": 0}
+
+    url_lines = []
+    for url in dict.fromkeys(web_results or []):
+        cost = count_tokens(f"- {url}") + 1
+        if cost <= remaining:
+            url_lines.append(f"- {url}")
+            remaining -= cost
+
+    node_lines = []
+    seen = set()
+    for name, description in nodes:
+        sentences = {}
+        for sentence in split_sentences(description or ""):
+            key = normalize_query(sentence)
+            if key in seen or key in sentences:
+                usage["duplicate_sentences"] += 1
+            elif key:
+                sentences[key] = sentence
+        header = f"**{name}**:"
+        cost = count_tokens(header) + 1
+        kept = []
+        for key, sentence in sentences.items():
+            sentence_cost = count_tokens(sentence) + 1
+            if cost + sentence_cost > remaining:
+                break
+            kept.append(key)
+            cost += sentence_cost
+        if not kept:
+            continue
+        if len(kept) < len(sentences):
+            usage["truncated"] += 1
+        seen.update(kept)
+        node_lines.append(" ".join([header] + [sentences[key] for key in kept]))
+        remaining -= cost
+
+    context = build_full_context(question, "\n".join(node_lines), "\n".join(url_lines))
+    usage.update(nodes_used=len(node_lines), urls_used=len(url_lines),
+                 prompt_tokens=count_message_tokens(build_messages(question, context)),
+                 counter="tiktoken" if get_encoding() is not None else "estimate")
+    PROMPT_TOKENS.observe(usage["prompt_tokens"])
+    logger.info("Context assembled", extra=usage)
+    return context
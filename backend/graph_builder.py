@@ -1,8 +1,8 @@
 # backend/graph_builder.py
 
 import networkx as nx
-import pickle
-import os
+
+from backend.graph_store import GRAPH_DB_PATH, GraphStore, open_store, graph_exists
 
 def build_graph():
     """Build a comprehensive Nestlé knowledge graph"""
@@ -138,16 +138,11 @@ def build_graph():
     
     G.add_edges_from(edges)
 
-    # Ensure the graph directory exists
-    os.makedirs("graph", exist_ok=True)
-    
-    # Save the graph
-    graph_path = os.path.join("graph", "graph.pkl")
-    with open(graph_path, "wb") as f:
-        pickle.dump(G, f)
+    # Save the graph (the store creates the graph directory if needed)
+    GraphStore(GRAPH_DB_PATH).write_networkx(G)
     
     print(f"✅ Graph built successfully with {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
-    print(f"📁 Graph saved to: {graph_path}")
+    print(f"📁 Graph saved to: {GRAPH_DB_PATH}")
     
     # Print some sample nodes for verification
     sample_nodes = list(G.nodes())[:5]
@@ -159,35 +154,30 @@ def add_node_to_graph(node_name, description, connections=None):
     """
     Add a new node to the existing graph
     connections: list of tuples (existing_node, relationship_type)
+    Only the new node and edges are written; the rest of the graph is untouched.
     """
     try:
-        # Load existing graph
-        graph_path = os.path.join("graph", "graph.pkl")
-        if os.path.exists(graph_path):
-            with open(graph_path, "rb") as f:
-                G = pickle.load(f)
-        else:
+        if not graph_exists():
             print("⚠️ No existing graph found, creating new one")
-            G = nx.Graph()
+        store = open_store()
         
         # Add the new node
-        G.add_node(node_name, description=description)
+        store.add_node(node_name, description)
         print(f"➕ Added node: {node_name}")
         
         # Add connections if provided
         if connections:
+            edges = []
             for existing_node, relationship in connections:
-                if existing_node in G.nodes:
-                    G.add_edge(node_name, existing_node)
+                if store.has_node(existing_node):
+                    edges.append((node_name, existing_node, 1.0, relationship))
                     print(f"🔗 Connected {node_name} to {existing_node}")
                 else:
                     print(f"⚠️ Node {existing_node} not found in graph")
+            store.add_edges(edges)
         
-        # Save updated graph
-        with open(graph_path, "wb") as f:
-            pickle.dump(G, f)
-        
-        print(f"✅ Graph updated and saved with {G.number_of_nodes()} nodes")
+        nodes, _ = store.count()
+        print(f"✅ Graph updated and saved with {nodes} nodes")
         return True
         
     except Exception as e:
@@ -197,18 +187,16 @@ def add_node_to_graph(node_name, description, connections=None):
 def view_graph_info():
     """View information about the current graph"""
     try:
-        graph_path = os.path.join("graph", "graph.pkl")
-        if not os.path.exists(graph_path):
+        if not graph_exists():
             print("❌ No graph file found")
             return
         
-        with open(graph_path, "rb") as f:
-            G = pickle.load(f)
+        G = open_store().load_graph().to_networkx()
         
         print(f"📊 Graph Information:")
         print(f"   Nodes: {G.number_of_nodes()}")
         print(f"   Edges: {G.number_of_edges()}")
-        print(f"   Is Connected: {nx.is_connected(G)}")
+        print(f"   Is Connected: {nx.is_connected(G) if G.number_of_nodes() else False}")
         
         print(f"\n🏷️ All Nodes:")
         for i, node in enumerate(sorted(G.nodes()), 1):
@@ -0,0 +1,141 @@
+# backend/graph_csr.py
+
+import numpy as np
+
+class CSRAdjacency:
+    """
+    Compressed sparse row adjacency over integer node positions: the
+    neighbours of node i are indices[indptr[i]:indptr[i + 1]], with the
+    matching edge weights in weights. Built once when the graph is loaded,
+    so neighbour expansion is array slicing instead of Python set walks.
+    """
+
+    def __init__(self, node_ids, indptr, indices, weights):
+        self.node_ids = np.asarray(list(node_ids), dtype=object)
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self._positions = {node: i for i, node in enumerate(self.node_ids)}
+
+    @classmethod
+    def from_edges(cls, node_ids, edges):
+        """Build from undirected (src, dst, weight) triples; edges to unknown nodes are skipped"""
+        node_ids = list(node_ids)
+        positions = {node: i for i, node in enumerate(node_ids)}
+        pairs = [(positions[src], positions[dst], weight) for src, dst, weight in edges
+                 if src in positions and dst in positions]
+
+        if pairs:
+            src, dst, weight = (np.array(column) for column in zip(*pairs))
+        else:
+            src, dst, weight = np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0)
+        # Store both directions, then sort by source row
+        rows = np.concatenate([src, dst]).astype(np.int64)
+        cols = np.concatenate([dst, src]).astype(np.int32)
+        vals = np.concatenate([weight, weight]).astype(np.float32)
+        order = np.argsort(rows, kind="stable")
+
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(node_ids)), out=indptr[1:])
+        return cls(node_ids, indptr, cols[order], vals[order])
+
+    @classmethod
+    def from_graph(cls, G):
+        """Build from a networkx graph or StoredGraph; missing weights count as 1.0"""
+        edges = ((src, dst, data.get("weight", 1.0)) for src, dst, data in G.edges(data=True))
+        return cls.from_edges(list(G.nodes), edges)
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, node):
+        return node in self._positions
+
+    def positions(self, nodes):
+        """Positions of the given nodes, skipping any not in the graph"""
+        return np.array([self._positions[node] for node in nodes if node in self._positions], dtype=np.int64)
+
+    def degree(self, positions):
+        return self.indptr[positions + 1] - self.indptr[positions]
+
+    def edge_ids(self, frontier):
+        """
+        Positions in indices/weights of every edge leaving the frontier, with
+        the slot in frontier each edge starts from
+        """
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        slots = np.repeat(np.arange(len(frontier)), counts)
+        # Offset of each edge within its row, added to the row start
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return starts[slots] + offsets, slots
+
+    def gather(self, frontier):
+        """
+        All edges leaving the frontier as (source slot, neighbour, weight)
+        arrays, where source slot indexes into frontier
+        """
+        edge_ids, slots = self.edge_ids(frontier)
+        return slots, self.indices[edge_ids], self.weights[edge_ids]
+
+    def expand(self, seeds, depth=1, seed_weights=None, decay=0.5):
+        """
+        Breadth-first expansion from a batch of seed positions, one vectorized
+        step per hop. Returns (positions, hops, scores) for every node reached
+        within depth hops, excluding the seeds. A node's score sums
+        seed weight x edge weight over the edges that reached it, scaled by
+        decay for each hop beyond the first, so nodes linked to several
+        relevant seeds by strong edges rank first.
+        """
+        seeds = np.asarray(seeds, dtype=np.int64)
+        weights = np.ones(len(seeds), dtype=np.float32) if seed_weights is None else np.asarray(seed_weights, dtype=np.float32)
+        # Work per hop is proportional to the frontier's edges, not the graph size
+        frontier, inverse = np.unique(seeds, return_inverse=True)
+        frontier_scores = np.bincount(inverse, weights=weights, minlength=len(frontier)).astype(np.float32)
+        visited = np.zeros(len(self), dtype=bool)
+        visited[frontier] = True
+        found_positions, found_hops, found_scores = [], [], []
+
+        for hop in range(1, depth + 1):
+            slots, neighbours, edge_weights = self.gather(frontier)
+            fresh = ~visited[neighbours]
+            if not fresh.any():
+                break
+            # frontier_scores already carry the decay of earlier hops, so each
+            # hop beyond the first applies it once more: hop h is scaled by decay ** (h - 1)
+            contribution = frontier_scores[slots[fresh]] * edge_weights[fresh] * (decay if hop > 1 else 1.0)
+            # Zero-weight edges still connect nodes, they just add no score
+            frontier, inverse = np.unique(neighbours[fresh], return_inverse=True)
+            frontier_scores = np.bincount(inverse, weights=contribution, minlength=len(frontier)).astype(np.float32)
+            visited[frontier] = True
+            found_positions.append(frontier)
+            found_hops.append(np.full(len(frontier), hop, dtype=np.int64))
+            found_scores.append(frontier_scores)
+
+        if not found_positions:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(found_positions), np.concatenate(found_hops), np.concatenate(found_scores)
+
+    def neighbours(self, position):
+        """(neighbour positions, edge weights) of a single node"""
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def position(self, node):
+        return self._positions[node]
+
+def get_csr(G):
+    """The CSR adjacency for a graph, built on first use and kept on the graph"""
+    csr = getattr(G, "csr", None)
+    if csr is None:
+        # networkx graphs carry it in their attribute dict
+        csr = G.graph.get("csr") if hasattr(G, "graph") else None
+        if csr is None:
+            csr = CSRAdjacency.from_graph(G)
+            if hasattr(G, "graph"):
+                G.graph["csr"] = csr
+    return csr
@@ -0,0 +1,148 @@
+# backend/graph_rank.py
+
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+from backend.graph_csr import get_csr
+from backend.vector_index import top_k_positions
+from backend.structured_logging import get_logger
+
+load_dotenv()
+
+logger = get_logger("graph_rank")
+
+# Graph-aware re-ranking of the similarity top-k with personalized PageRank;
+# off by default because it changes the order get_top_nodes returns
+GRAPH_RERANK_ENABLED = os.getenv("GRAPH_RERANK_ENABLED", "false").lower() == "true"
+# How many similarity candidates seed the walk
+GRAPH_RERANK_CANDIDATES = int(os.getenv("GRAPH_RERANK_CANDIDATES", "20"))
+# Share of the final score that comes from PageRank (the rest is similarity)
+GRAPH_RERANK_WEIGHT = float(os.getenv("GRAPH_RERANK_WEIGHT", "0.3"))
+PPR_DAMPING = float(os.getenv("PPR_DAMPING", "0.85"))
+PPR_MAX_ITERATIONS = int(os.getenv("PPR_MAX_ITERATIONS", "30"))
+PPR_TOLERANCE = float(os.getenv("PPR_TOLERANCE", "1e-6"))
+# Per-query budget; propagation stops early and uses what it has when exceeded
+PPR_TIME_BUDGET_MS = float(os.getenv("PPR_TIME_BUDGET_MS", "5"))
+# Keep the propagation operator on the loaded graph between queries
+PPR_CACHE_OPERATOR = os.getenv("PPR_CACHE_OPERATOR", "true").lower() == "true"
+
+class PropagationOperator:
+    """
+    One random-walk step over a CSR adjacency: mass at a node moves to its
+    neighbours in proportion to edge weight. Stored as flat edge arrays so
+    applying it is a gather, a multiply and a bincount.
+    """
+
+    def __init__(self, csr):
+        degree = csr.indptr[1:] - csr.indptr[:-1]
+        self.csr = csr
+        self.size = len(csr)
+        self.sources = np.repeat(np.arange(self.size), degree)
+        self.targets = csr.indices.astype(np.int64)
+        strength = np.bincount(self.sources, weights=csr.weights, minlength=self.size)
+        # Nodes with no (positive) edges hand their mass back to the seeds
+        self.dangling = strength <= 0
+        safe = np.where(self.dangling, 1.0, strength)
+        self.probabilities = (csr.weights / safe[self.sources]).astype(np.float64)
+
+    def apply(self, mass):
+        active = np.flatnonzero(mass)
+        if len(active) * 4 < self.size:
+            # Early on the walk has only reached a few hops from the seeds,
+            # so only push from nodes that hold mass
+            edge_ids, slots = self.csr.edge_ids(active)
+            return np.bincount(self.targets[edge_ids], weights=mass[active][slots] * self.probabilities[edge_ids],
+                               minlength=self.size)
+        return np.bincount(self.targets, weights=mass[self.sources] * self.probabilities, minlength=self.size)
+
+def get_operator(csr, cache=PPR_CACHE_OPERATOR):
+    """
+    Propagation operator for an adjacency, reused across queries when caching
+    is on. Call it at warm-up so the first query does not pay for the build.
+    """
+    operator = getattr(csr, "_propagation_operator", None)
+    if operator is None:
+        operator = PropagationOperator(csr)
+        if cache:
+            csr._propagation_operator = operator
+    return operator
+
+def personalized_pagerank(csr, seed_positions, seed_weights, damping=PPR_DAMPING,
+                          max_iterations=PPR_MAX_ITERATIONS, tolerance=PPR_TOLERANCE,
+                          time_budget_ms=PPR_TIME_BUDGET_MS):
+    """
+    Power iteration for PageRank restarted at the seeds in proportion to
+    seed_weights. Returns (scores over all nodes, iterations run); stops at
+    convergence, after max_iterations, or when the time budget runs out.
+    """
+    deadline = time.perf_counter() + time_budget_ms / 1000
+    operator = get_operator(csr)
+
+    restart = np.zeros(operator.size)
+    np.add.at(restart, seed_positions, np.clip(seed_weights, 0, None))
+    if restart.sum() <= 0:
+        restart[seed_positions] = 1.0
+    restart /= restart.sum()
+
+    scores = restart.copy()
+    iterations = 0
+    while iterations < max_iterations and time.perf_counter() < deadline:
+        dangling_mass = scores[operator.dangling].sum()
+        updated = (1 - damping) * restart + damping * (operator.apply(scores) + dangling_mass * restart)
+        iterations += 1
+        delta = np.abs(updated - scores).sum()
+        scores = updated
+        if delta < tolerance:
+            break
+    return scores, iterations
+
+def rerank_nodes(candidates, similarities, G, k, weight=GRAPH_RERANK_WEIGHT):
+    """
+    Re-rank similarity candidates with personalized PageRank seeded by their
+    similarities, so nodes the graph links to several relevant nodes move up
+    and well-connected neighbours outside the candidates can enter the top k.
+    Falls back to the similarity order if the graph has no usable edges.
+    """
+    csr = get_csr(G)
+    pairs = [(node, sim) for node, sim in zip(candidates, similarities) if node in csr]
+    if not pairs or len(csr.indices) == 0 or weight <= 0:
+        return list(candidates[:k])
+
+    nodes = [node for node, _ in pairs]
+    sims = np.clip(np.array([sim for _, sim in pairs], dtype=np.float64), 0, None)
+    positions = csr.positions(nodes)
+
+    start = time.perf_counter()
+    ppr, iterations = personalized_pagerank(csr, positions, sims)
+    if iterations == 0:
+        return list(candidates[:k])
+
+    # Nodes outside the candidate pool get the weakest candidate's similarity
+    similarity = np.full(len(csr), sims.min())
+    similarity[positions] = sims
+    pool = np.union1d(positions, top_k_positions(ppr, k))
+
+    top_sim = similarity[pool].max() or 1.0
+    top_ppr = ppr[pool].max() or 1.0
+    combined = (1 - weight) * similarity[pool] / top_sim + weight * ppr[pool] / top_ppr
+    ranked = [csr.node_ids[p] for p in pool[np.argsort(-combined, kind="stable")][:k]]
+
+    logger.debug("Re-ranked candidates with PageRank", extra={
+        "candidates": len(nodes),
+        "iterations": iterations,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    })
+    return ranked
+
+def warm_up_ranking(G):
+    """
+    Build and cache the propagation operator and run one re-rank, so the
+    first query does not pay one-off costs (the build, lazy numpy imports)
+    """
+    csr = get_csr(G)
+    if len(csr) == 0:
+        return
+    get_operator(csr)
+    rerank_nodes([csr.node_ids[0]], [1.0], G, 1)
@@ -0,0 +1,289 @@
+# backend/graph_store.py
+
+import os
+import pickle
+import sqlite3
+import sys
+import urllib.parse
+from contextlib import closing
+import numpy as np
+
+from backend.graph_csr import CSRAdjacency
+
+GRAPH_DB_PATH = os.path.join("graph", "graph.db")
+LEGACY_GRAPH_PATH = os.path.join("graph", "graph.pkl")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    name TEXT PRIMARY KEY,
+    description TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS edges (
+    src TEXT NOT NULL,
+    dst TEXT NOT NULL,
+    weight REAL NOT NULL DEFAULT 1.0,
+    relation TEXT,
+    PRIMARY KEY (src, dst)
+);
+CREATE INDEX IF NOT EXISTS edges_dst ON edges (dst);
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('graph_version', 0);
+"""
+
+# Bumped in the same transaction as every node/edge write, so readers can
+# cheaply tell whether the graph changed (embedding writes do not count)
+BUMP_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'graph_version'"
+
+class StoredGraph:
+    """
+    Read-only graph loaded from the store with just what retrieval needs:
+    node descriptions and weighted adjacency, as dicts and as CSR arrays.
+    Supports the subset of the networkx.Graph API the retriever uses,
+    without importing networkx.
+    """
+
+    def __init__(self, nodes, edges):
+        self.nodes = {name: {"description": description} for name, description in nodes}
+        self.adjacency = {name: {} for name in self.nodes}
+        self._edges = []
+        for src, dst, weight in edges:
+            if src in self.adjacency and dst in self.adjacency:
+                self.adjacency[src][dst] = weight
+                self.adjacency[dst][src] = weight
+                self._edges.append((src, dst, weight))
+        # Array adjacency for vectorized neighbour expansion at query time
+        self.csr = CSRAdjacency.from_edges(self.nodes, self._edges)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.nodes
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self._edges)
+
+    def neighbors(self, node):
+        return iter(self.adjacency[node])
+
+    def edges(self, data=False):
+        if data:
+            return [(src, dst, {"weight": weight}) for src, dst, weight in self._edges]
+        return [(src, dst) for src, dst, _ in self._edges]
+
+    def to_networkx(self):
+        import networkx as nx
+        G = nx.Graph()
+        for name, attrs in self.nodes.items():
+            G.add_node(name, **attrs)
+        G.add_weighted_edges_from(self._edges)
+        return G
+
+def _upsert_nodes(conn, nodes):
+    conn.executemany(
+        "INSERT INTO nodes (name, description) VALUES (?, ?) "
+        "ON CONFLICT (name) DO UPDATE SET description = excluded.description",
+        ((str(name), description or "") for name, description in nodes)
+    )
+
+def _upsert_edges(conn, edges):
+    rows = []
+    for edge in edges:
+        src, dst = sorted((str(edge[0]), str(edge[1])))
+        weight = edge[2] if len(edge) > 2 and edge[2] is not None else 1.0
+        relation = edge[3] if len(edge) > 3 else None
+        rows.append((src, dst, float(weight), relation))
+    conn.executemany(
+        "INSERT INTO edges (src, dst, weight, relation) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (src, dst) DO UPDATE SET weight = excluded.weight, relation = excluded.relation",
+        rows
+    )
+
+class GraphStore:
+    """
+    SQLite-backed knowledge graph: nodes, descriptions, weighted edges and
+    embedding vectors. Appends are single-row writes, so adding a node or
+    edge never rewrites the rest of the graph.
+    """
+
+    def __init__(self, path=GRAPH_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets every gunicorn worker read while one process writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=30))
+
+    def add_nodes(self, nodes):
+        """Insert or update (name, description) pairs"""
+        with self._connect() as conn, conn:
+            _upsert_nodes(conn, nodes)
+            conn.execute(BUMP_VERSION)
+
+    def add_node(self, name, description=""):
+        self.add_nodes([(name, description)])
+
+    def add_edges(self, edges):
+        """Insert or update (src, dst[, weight[, relation]]) tuples; edges are undirected"""
+        with self._connect() as conn, conn:
+            _upsert_edges(conn, edges)
+            conn.execute(BUMP_VERSION)
+
+    def add_edge(self, src, dst, weight=1.0, relation=None):
+        self.add_edges([(src, dst, weight, relation)])
+
+    def remove_nodes_with_prefix(self, prefix):
+        """Delete nodes whose name starts with prefix, and their edges; returns how many"""
+        n = len(prefix)
+        with self._connect() as conn, conn:
+            conn.execute(
+                "DELETE FROM edges WHERE substr(src, 1, ?) = ? OR substr(dst, 1, ?) = ?",
+                (n, prefix, n, prefix)
+            )
+            removed = conn.execute("DELETE FROM nodes WHERE substr(name, 1, ?) = ?", (n, prefix)).rowcount
+            if removed:
+                conn.execute(BUMP_VERSION)
+        return removed
+
+    def node_names(self):
+        with self._connect() as conn:
+            return [name for (name,) in conn.execute("SELECT name FROM nodes ORDER BY rowid")]
+
+    def has_node(self, name):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM nodes WHERE name = ?", (name,)).fetchone() is not None
+
+    def graph_version(self):
+        """Counter that changes whenever nodes or edges are written"""
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'graph_version'").fetchone()[0]
+
+    def count(self):
+        """(number of nodes, number of edges)"""
+        with self._connect() as conn:
+            nodes = conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+            edges = conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+        return nodes, edges
+
+    def load_graph(self):
+        """Load nodes and adjacency as a StoredGraph, in insertion order"""
+        with self._connect() as conn:
+            nodes = conn.execute("SELECT name, description FROM nodes ORDER BY rowid").fetchall()
+            edges = conn.execute("SELECT src, dst, weight FROM edges ORDER BY rowid").fetchall()
+        return StoredGraph(nodes, edges)
+
+    def get_embeddings(self, keys):
+        """Cached vectors for the given content hashes, as {key: float32 vector}"""
+        keys = list(keys)
+        found = {}
+        with self._connect() as conn:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_embeddings(self, vectors):
+        """Store {key: vector} without touching other rows"""
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                ((key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items())
+            )
+
+    def prune_embeddings(self, keep_keys):
+        """Drop vectors whose content hash is not in keep_keys"""
+        with self._connect() as conn, conn:
+            conn.execute("CREATE TEMP TABLE keep (key TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO keep (key) VALUES (?)", ((key,) for key in keep_keys))
+            conn.execute("DELETE FROM embeddings WHERE key NOT IN (SELECT key FROM keep)")
+
+    def clear_graph(self):
+        """Remove all nodes and edges (embeddings are kept, keyed by content)"""
+        with self._connect() as conn, conn:
+            conn.execute("DELETE FROM edges")
+            conn.execute("DELETE FROM nodes")
+            conn.execute(BUMP_VERSION)
+
+    def write_networkx(self, G):
+        """
+        Replace the stored nodes and edges with those of a networkx graph,
+        in one transaction: readers see the old graph or the new one, never
+        an empty or half-written one
+        """
+        with self._connect() as conn, conn:
+            conn.execute("DELETE FROM edges")
+            conn.execute("DELETE FROM nodes")
+            _upsert_nodes(conn, ((node, G.nodes[node].get("description", "")) for node in G.nodes))
+            _upsert_edges(conn, ((src, dst, data.get("weight"), data.get("relation"))
+                                 for src, dst, data in G.edges(data=True)))
+            conn.execute(BUMP_VERSION)
+
+def read_graph_version(db_path=GRAPH_DB_PATH, timeout=1.0):
+    """
+    meta.graph_version over a read-only connection: no pragmas, schema or
+    writes, so it is cheap enough to poll. None if the store is missing.
+    """
+    if not os.path.exists(db_path):
+        return None
+    uri = f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro"
+    with closing(sqlite3.connect(uri, uri=True, timeout=timeout)) as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'graph_version'").fetchone()
+    return row[0] if row else None
+
+def graph_exists(db_path=GRAPH_DB_PATH, legacy_path=LEGACY_GRAPH_PATH):
+    """True if there is a graph to load, in the store or as a legacy pickle"""
+    return os.path.exists(db_path) or os.path.exists(legacy_path)
+
+def migrate_from_pickle(pickle_path=LEGACY_GRAPH_PATH, db_path=GRAPH_DB_PATH):
+    """
+    One-shot migration of a pickled networkx graph into the store. The new
+    database is built under a temporary name and moved into place, so
+    concurrent workers never see a half-migrated graph.
+    """
+    with open(pickle_path, "rb") as f:
+        G = pickle.load(f)
+
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    store = GraphStore(tmp_path)
+    store.write_networkx(G)
+    with store._connect() as conn:
+        # Fold the WAL back into the main file before it is renamed
+        conn.execute("PRAGMA journal_mode=DELETE")
+    os.replace(tmp_path, db_path)
+
+    nodes, edges = GraphStore(db_path).count()
+    print(f"✅ Migrated {pickle_path} to {db_path} ({nodes} nodes, {edges} edges)")
+    return GraphStore(db_path)
+
+def open_store(db_path=GRAPH_DB_PATH, legacy_path=LEGACY_GRAPH_PATH):
+    """Open the graph store, migrating a legacy graph.pkl on first use"""
+    if not os.path.exists(db_path) and os.path.exists(legacy_path):
+        print(f"📦 Migrating legacy graph {legacy_path} to {db_path}...")
+        return migrate_from_pickle(legacy_path, db_path)
+    return GraphStore(db_path)
+
+if __name__ == "__main__":
+    # python -m backend.graph_store migrate [graph.pkl] [graph.db]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        migrate_from_pickle(*sys.argv[2:4])
+    else:
+        print("Usage: python -m backend.graph_store migrate [graph.pkl] [graph.db]")
@@ -0,0 +1,152 @@
+# backend/http_client.py
+
+import asyncio
+import random
+import threading
+import weakref
+import os
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection pool and retry settings shared by all outbound scraper traffic
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "8"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.3"))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+_host_semaphores = weakref.WeakKeyDictionary()
+
+class LoopLocalClient:
+    """
+    One long-lived httpx.AsyncClient per event loop, made by factory on
+    first use: httpx connections are bound to the loop that opened them
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = self.factory()
+            self._clients[loop] = client
+        return client
+
+    async def close(self):
+        """Close the client for the running event loop (call on shutdown)"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+def get_default_headers():
+    """Request headers used for all outbound scraper traffic"""
+    return {
+        "User-Agent": os.getenv("USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+    }
+
+def get_session():
+    """
+    Module-level requests session with keep-alive, a bounded connection
+    pool per host and automatic retries with exponential backoff
+    """
+    global _session
+    if _session is not None:
+        return _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_MAX_RETRIES,
+                backoff_factor=HTTP_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUS_CODES,
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                raise_on_status=False
+            )
+            # urllib3 keeps one pool per host; pool_block caps concurrent connections to it
+            adapter = HTTPAdapter(
+                pool_connections=HTTP_MAX_CONNECTIONS,
+                pool_maxsize=HTTP_MAX_CONNECTIONS_PER_HOST,
+                pool_block=True,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.headers.update(get_default_headers())
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+def http_get(url, headers=None, timeout=HTTP_TIMEOUT):
+    """Blocking GET through the pooled session"""
+    return get_session().get(url, headers=headers, timeout=timeout)
+
+_async_clients = LoopLocalClient(lambda: httpx.AsyncClient(
+    headers=get_default_headers(),
+    timeout=HTTP_TIMEOUT,
+    follow_redirects=True,
+    limits=httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+))
+
+def get_async_client():
+    """Long-lived pooled httpx client for the running event loop"""
+    return _async_clients.get()
+
+def _get_host_semaphore(url):
+    """Semaphore limiting concurrent async requests to one host (httpx has no per-host limit)"""
+    loop = asyncio.get_running_loop()
+    semaphores = _host_semaphores.setdefault(loop, {})
+    host = urlparse(url).netloc
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+    return semaphores[host]
+
+def _backoff_delay(attempt):
+    """Exponential backoff with full jitter, matching urllib3's backoff_factor scale"""
+    return random.uniform(0, HTTP_BACKOFF_FACTOR * (2 ** attempt))
+
+async def async_http_get(url, headers=None, timeout=HTTP_TIMEOUT, bucket=None):
+    """
+    Non-blocking GET through the pooled client, retrying connection errors
+    and retryable status codes with backoff. With a rate-limit bucket (any
+    object with an async wait_async()), every attempt waits for a token.
+    """
+    client = get_async_client()
+    async with _get_host_semaphore(url):
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            last_attempt = attempt == HTTP_MAX_RETRIES
+            if bucket is not None:
+                await bucket.wait_async()
+            try:
+                response = await client.get(url, headers=headers, timeout=timeout)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    return response
+            await asyncio.sleep(_backoff_delay(attempt))
+
+async def close_async_client():
+    """Close the pooled client for the running event loop (call on shutdown)"""
+    _host_semaphores.pop(asyncio.get_running_loop(), None)
+    await _async_clients.close()
@@ -0,0 +1,370 @@
+# backend/ingest.py
+"""
+Offline ingestion of Nestlé pages into the knowledge graph.
+
+Pages come from a URL list, a sitemap or a local directory of saved HTML.
+Their main content is extracted, split into overlapping chunks and stored
+as graph nodes (named <page url>#chunk-<n>) linked to the brand and topic
+nodes they mention. Chunk vectors are written to the store's embedding
+cache in batches, so the next startup indexes them without re-encoding.
+
+Pages, text blocks and chunks are all streamed through generators; only
+one embedding batch is held in memory at a time.
+
+    python -m backend.ingest --html-dir saved_pages/
+    python -m backend.ingest --sitemap https://www.madewithnestle.ca/sitemap.xml --max-pages 200
+    python -m backend.ingest --urls urls.txt
+"""
+
+import argparse
+import io
+import itertools
+import os
+import re
+import sys
+import time
+import unicodedata
+import xml.etree.ElementTree as ET
+from dotenv import load_dotenv
+
+from backend.graph_store import open_store
+from backend.http_client import http_get
+from backend.retriever import embedding_key, get_model
+from backend.web_scraper import make_soup, wait_for_rate_limit
+
+load_dotenv()
+
+# Target chunk size and how much of the previous chunk each one repeats (characters)
+INGEST_CHUNK_CHARS = int(os.getenv("INGEST_CHUNK_CHARS", "800"))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "150"))
+# Chunks encoded and written per batch
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+# Paragraphs shorter than this are navigation or boilerplate, not content
+INGEST_MIN_BLOCK_CHARS = int(os.getenv("INGEST_MIN_BLOCK_CHARS", "30"))
+# Most brand/topic nodes a chunk is linked to, by number of mentions
+INGEST_MAX_LINKS = int(os.getenv("INGEST_MAX_LINKS", "5"))
+# Node that chunks mentioning no known node are attached to
+INGEST_DEFAULT_NODE = os.getenv("INGEST_DEFAULT_NODE", "Made with Nestlé Website")
+
+CHUNK_MARKER = "#chunk-"
+
+# Edge weights: the chunk names the node, only its page does, consecutive chunks
+MENTION_WEIGHT = 1.0
+PAGE_WEIGHT = 0.5
+NEXT_WEIGHT = 0.5
+
+STRIP_TAGS = ["script", "style", "noscript", "template", "nav", "header", "footer", "aside", "form", "svg", "iframe", "button"]
+BLOCK_TAGS = ["h1", "h2", "h3", "h4", "h5", "p", "li", "blockquote", "dd", "td", "figcaption"]
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5"}
+
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+def is_chunk_node(name):
+    return CHUNK_MARKER in name
+
+def chunk_prefix(url):
+    return f"{url}{CHUNK_MARKER}"
+
+# ----- Page sources: each yields (url, html) -----
+def iter_html_dir(path):
+    """Saved pages under a local directory, in a stable order"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith((".html", ".htm")):
+                continue
+            file_path = os.path.join(root, name)
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                html = f.read()
+            # Pages without a canonical link keep their path as the url
+            yield os.path.relpath(file_path, path).replace(os.sep, "/"), html
+
+def iter_url_file(path):
+    """URLs listed one per line; blank lines and # comments are skipped"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            url = line.strip()
+            if url and not url.startswith("#"):
+                yield url
+
+def iter_sitemap(source):
+    """
+    Page URLs from a sitemap or sitemap index, given as a URL or a local
+    file. The XML is parsed incrementally; nested sitemaps are followed.
+    """
+    if os.path.exists(source):
+        stream = open(source, "rb")
+    else:
+        wait_for_rate_limit(source)
+        response = http_get(source)
+        response.raise_for_status()
+        stream = io.BytesIO(response.content)
+
+    nested = []
+    with stream:
+        for _, element in ET.iterparse(stream):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag in ("url", "sitemap"):
+                loc = next((child.text for child in element if child.tag.rsplit("}", 1)[-1] == "loc"), None)
+                if loc and loc.strip():
+                    if tag == "url":
+                        yield loc.strip()
+                    else:
+                        nested.append(loc.strip())
+                element.clear()
+
+    for sitemap in nested:
+        yield from iter_sitemap(sitemap)
+
+def fetch_pages(urls):
+    """Download pages politely (per-host rate limit), skipping failures and non-HTML"""
+    for url in urls:
+        wait_for_rate_limit(url)
+        try:
+            response = http_get(url)
+        except Exception as e:
+            print(f"⚠️ Failed to fetch {url}: {e}")
+            continue
+        if response.status_code != 200:
+            print(f"⚠️ Failed to fetch {url}: Status {response.status_code}")
+            continue
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            continue
+        yield url, response.text
+
+# ----- Extraction and chunking -----
+def extract_main_content(html):
+    """
+    (title, canonical url or None, text blocks) for a page. Boilerplate
+    elements are dropped and the main/article element is preferred over
+    the whole body; the blocks are yielded lazily.
+    """
+    soup = make_soup(html)
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    canonical = soup.find("link", rel="canonical") or soup.find("meta", property="og:url")
+    canonical_url = (canonical.get("href") or canonical.get("content")) if canonical else None
+
+    for tag in soup(STRIP_TAGS):
+        tag.decompose()
+    root = (soup.find("main") or soup.find("article") or soup.find(attrs={"role": "main"})
+            or soup.find("div", class_="content") or soup.body or soup)
+    if not title:
+        heading = root.find("h1")
+        title = heading.get_text(" ", strip=True) if heading else ""
+    return title, canonical_url, iter_blocks(root)
+
+def iter_blocks(root):
+    """Whitespace-normalized text of the innermost block elements, without repeats"""
+    seen = set()
+    found = False
+    for element in root.find_all(BLOCK_TAGS):
+        # A block containing other blocks is covered by them
+        if element.find(BLOCK_TAGS):
+            continue
+        text = _WHITESPACE.sub(" ", element.get_text(" ", strip=True))
+        if text in seen or (len(text) < INGEST_MIN_BLOCK_CHARS and element.name not in HEADING_TAGS):
+            continue
+        seen.add(text)
+        found = True
+        yield text
+
+    if not found:
+        # Pages built from bare divs: fall back to their text lines
+        for line in root.get_text("\n", strip=True).split("\n"):
+            text = _WHITESPACE.sub(" ", line)
+            if len(text) >= INGEST_MIN_BLOCK_CHARS and text not in seen:
+                seen.add(text)
+                yield text
+
+def split_sentences(text, max_chars):
+    """Sentences of text, hard-wrapping any longer than max_chars at whitespace"""
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            yield sentence[:cut]
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            yield sentence
+
+def chunk_blocks(blocks, max_chars=INGEST_CHUNK_CHARS, overlap_chars=INGEST_CHUNK_OVERLAP):
+    """
+    Pack sentences from the blocks into chunks of up to max_chars, breaking
+    only between sentences. Each chunk starts with the last sentences of
+    the previous one (up to overlap_chars) so context spans the boundary.
+    """
+    current, size, fresh = [], 0, False
+    for block in blocks:
+        for sentence in split_sentences(block, max_chars):
+            if fresh and size + len(sentence) > max_chars:
+                yield " ".join(current)
+                tail, tail_size = [], 0
+                for previous in reversed(current):
+                    if tail_size + len(previous) + 1 > overlap_chars:
+                        break
+                    tail.insert(0, previous)
+                    tail_size += len(previous) + 1
+                current, size, fresh = tail, tail_size, False
+            current.append(sentence)
+            size += len(sentence) + 1
+            fresh = True
+    if fresh:
+        yield " ".join(current)
+
+# ----- Linking and writing -----
+def _fold(text):
+    """Lower-case and strip accents, so "Nestle" matches "Nestlé" """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+class NodeLinker:
+    """
+    Finds existing graph nodes mentioned in text. Names match across case,
+    accents and spacing, so "KitKat", "Kit Kat" and "kit-kat" are the same.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        candidates = []
+        for i, name in enumerate(self.names):
+            tokens = [_fold(t) for t in re.split(r"[\s\-]+", _CAMEL_BOUNDARY.sub(" ", name)) if t]
+            if tokens:
+                candidates.append((sum(map(len, tokens)), i, tokens))
+        # Regex alternation takes the first alternative that matches, not the
+        # longest, so "Nestlé Canada" must be tried before "Nestlé"
+        candidates.sort(key=lambda candidate: -candidate[0])
+        alternatives = [
+            f"(?P<n{i}>" + r"[\s\-]*".join(map(re.escape, tokens)) + ")"
+            for _, i, tokens in candidates
+        ]
+        # Lookarounds rather than \b, which never matches next to a name that
+        # starts or ends with punctuation (e.g. "Coffee-mate®")
+        self.pattern = re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)") if alternatives else None
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def find(self, text, limit=INGEST_MAX_LINKS):
+        """Mentioned node names, most mentioned first"""
+        if self.pattern is None:
+            return []
+        counts = {}
+        for match in self.pattern.finditer(_fold(text)):
+            name = self.names[int(match.lastgroup[1:])]
+            counts[name] = counts.get(name, 0) + 1
+        return sorted(counts, key=lambda name: -counts[name])[:limit]
+
+class ChunkWriter:
+    """
+    Buffers chunk nodes and edges, then encodes the batch in one call and
+    writes nodes, edges and vectors to the store together
+    """
+
+    def __init__(self, store, model, batch_size=INGEST_BATCH_SIZE):
+        self.store = store
+        self.model = model
+        self.batch_size = batch_size
+        self.nodes = []
+        self.edges = []
+        self.embedded = 0
+
+    def add(self, name, description, edges):
+        self.nodes.append((name, description))
+        self.edges.extend(edges)
+        if len(self.nodes) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.nodes:
+            return
+        if self.model is not None:
+            texts = [description for _, description in self.nodes]
+            vectors = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+            # Keyed exactly as the retriever keys node texts, so startup finds them cached
+            self.store.put_embeddings({embedding_key(text): vector for text, vector in zip(texts, vectors)})
+            self.embedded += len(texts)
+        self.store.add_nodes(self.nodes)
+        self.store.add_edges(self.edges)
+        self.nodes, self.edges = [], []
+
+def ingest_pages(pages, store=None, max_pages=None, chunk_chars=INGEST_CHUNK_CHARS,
+                 overlap_chars=INGEST_CHUNK_OVERLAP, batch_size=INGEST_BATCH_SIZE):
+    """
+    Chunk, embed and store (url, html) pages. Re-ingesting a page replaces
+    its previous chunks. Returns counts of pages, chunks and links written.
+    """
+    store = store or open_store()
+    linker = NodeLinker(name for name in store.node_names() if not is_chunk_node(name))
+    model = get_model()
+    if model is None:
+        print("⚠️ Encoder unavailable; chunks will be embedded when the app next builds its index")
+    writer = ChunkWriter(store, model, batch_size)
+    stats = {"pages": 0, "empty_pages": 0, "chunks": 0, "links": 0}
+
+    for url, html in itertools.islice(pages, max_pages):
+        title, canonical_url, blocks = extract_main_content(html)
+        url = canonical_url or url
+        # Pending chunks may belong to this url if it appears twice in the input
+        writer.flush()
+        store.remove_nodes_with_prefix(chunk_prefix(url))
+
+        page_links = linker.find(f"{title} {url.replace('/', ' ')}")
+        previous = None
+        for i, text in enumerate(chunk_blocks(blocks, chunk_chars, overlap_chars)):
+            name = f"{chunk_prefix(url)}{i}"
+            description = f"{title}\n{text}" if title else text
+            mentioned = linker.find(text)
+            edges = [(name, node, MENTION_WEIGHT, "mentions") for node in mentioned]
+            edges += [(name, node, PAGE_WEIGHT, "page") for node in page_links if node not in mentioned]
+            if not edges and INGEST_DEFAULT_NODE in linker:
+                edges.append((name, INGEST_DEFAULT_NODE, PAGE_WEIGHT, "page"))
+            if previous:
+                edges.append((previous, name, NEXT_WEIGHT, "next"))
+            writer.add(name, description, edges)
+            stats["chunks"] += 1
+            stats["links"] += len(edges)
+            previous = name
+
+        stats["pages"] += 1
+        if previous is None:
+            stats["empty_pages"] += 1
+        if stats["pages"] % 25 == 0:
+            print(f"📄 {stats['pages']} pages, {stats['chunks']} chunks so far...")
+
+    writer.flush()
+    stats["embedded"] = writer.embedded
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk and index Nestlé pages into the knowledge graph")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--html-dir", help="directory of saved .html pages")
+    source.add_argument("--urls", help="file with one URL per line")
+    source.add_argument("--sitemap", help="sitemap URL or file (sitemap indexes are followed)")
+    parser.add_argument("--max-pages", type=int, default=None)
+    parser.add_argument("--chunk-chars", type=int, default=INGEST_CHUNK_CHARS)
+    parser.add_argument("--overlap-chars", type=int, default=INGEST_CHUNK_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.html_dir:
+        pages = iter_html_dir(args.html_dir)
+    elif args.urls:
+        pages = fetch_pages(iter_url_file(args.urls))
+    else:
+        pages = fetch_pages(iter_sitemap(args.sitemap))
+
+    start = time.perf_counter()
+    print("📥 Ingesting pages into the knowledge graph...")
+    stats = ingest_pages(pages, max_pages=args.max_pages, chunk_chars=args.chunk_chars,
+                         overlap_chars=args.overlap_chars, batch_size=args.batch_size)
+    print(f"✅ Ingested {stats['pages']} pages into {stats['chunks']} chunks with {stats['links']} links "
+          f"({stats['embedded']} embedded) in {time.perf_counter() - start:.1f}s")
+    if stats["empty_pages"]:
+        print(f"⚠️ {stats['empty_pages']} pages had no extractable content")
+    print("🔄 Restart the app (or rebuild the node index) to serve the new chunks")
+
+if __name__ == "__main__":
+    sys.exit(main())
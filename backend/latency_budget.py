@@ -0,0 +1,58 @@
+# backend/latency_budget.py
+
+import os
+import time
+from dotenv import load_dotenv
+
+from backend.structured_logging import get_logger
+
+load_dotenv()
+
+logger = get_logger("latency_budget")
+
+# End-to-end budget (seconds) for one /chat request, well inside the worker timeout
+CHAT_BUDGET_SECONDS = float(os.getenv("CHAT_BUDGET_SECONDS", "20"))
+# Share of the budget each context stage may use; the two run concurrently
+GRAPH_BUDGET_SHARE = float(os.getenv("GRAPH_BUDGET_SHARE", "0.15"))
+SEARCH_BUDGET_SHARE = float(os.getenv("SEARCH_BUDGET_SHARE", "0.25"))
+# Time kept back from the LLM for building and sending the response
+RESPONSE_RESERVE_SECONDS = float(os.getenv("RESPONSE_RESERVE_SECONDS", "0.25"))
+
+class LatencyBudget:
+    """
+    Deadline for one request, sliced between its stages. Stages that run
+    over fall back to a degraded result and are recorded in `degraded`.
+    """
+
+    def __init__(self, total=CHAT_BUDGET_SECONDS, reserve=RESPONSE_RESERVE_SECONDS):
+        self.total = total
+        self.reserve = reserve
+        self.started = time.monotonic()
+        self.deadline = self.started + total
+        self.degraded = []
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        """Seconds left, minus the response reserve, never negative"""
+        return max(0.0, self.deadline - time.monotonic() - self.reserve)
+
+    def slice(self, share, cap=None):
+        """
+        Timeout for a stage: its share of the total budget, no more than cap
+        (a stage's own configured limit) and no more than what is left
+        """
+        timeout = min(self.total * share, self.remaining())
+        return timeout if cap is None else min(timeout, cap)
+
+    def degrade(self, stage, reason):
+        """Record that a stage fell back to its degraded path"""
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+        logger.warning("Stage degraded", extra={
+            "stage": stage,
+            "reason": reason,
+            "elapsed_s": round(self.elapsed(), 3),
+            "budget_s": self.total,
+        })
@@ -0,0 +1,290 @@
+# backend/llm_client.py
+
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+
+import httpx
+from dotenv import load_dotenv
+
+from backend.http_client import LoopLocalClient
+from backend.metrics import counter
+from backend.structured_logging import get_logger
+
+load_dotenv()
+
+logger = get_logger("llm")
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+# Setting the endpoint switches every call to Azure OpenAI
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-35-turbo")
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2023-12-01-preview")
+
+# Deadline (s) for a whole call, retries included, when the caller gives none;
+# for streams it bounds getting the response started and each wait for a chunk
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+# Retries of 429/5xx responses and connection errors, with full-jitter backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# Hedging: a call still unanswered after the p95 of recent latencies gets a
+# second, identical request and the first answer wins. Costs extra tokens.
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+LLM_ATTEMPTS = counter("nestle_llm_attempts_total", "LLM HTTP attempts by status code or error", ["result"])
+LLM_HEDGES = counter("nestle_llm_hedges_total", "Hedged LLM requests launched, and those that answered first", ["outcome"])
+
+class LLMError(RuntimeError):
+    """The completion failed: a non-retryable response, retries exhausted or the deadline passed"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class RetryableError(Exception):
+    """A failed attempt worth repeating (429, 5xx, timeout, connection error)"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def parse_retry_after(response):
+    """Seconds the server asked us to wait, if it said (dates are ignored)"""
+    for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        try:
+            return float(response.headers[header]) / scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+class LatencyTracker:
+    """Latencies of recent successful calls and their quantiles"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def quantile(self, q, min_samples=1):
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class LLMClient:
+    """
+    Chat completions over a long-lived pooled httpx client, for OpenAI or
+    Azure OpenAI. Each call has a deadline covering every attempt; 429 and
+    5xx responses and connection errors are retried with jittered backoff
+    (honouring Retry-After) while the deadline allows.
+    """
+
+    def __init__(self, api_key=OPENAI_API_KEY, api_base=OPENAI_API_BASE, azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                 deployment=AZURE_OPENAI_DEPLOYMENT_NAME, api_version=AZURE_OPENAI_API_VERSION,
+                 max_retries=LLM_MAX_RETRIES, hedge=LLM_HEDGE_ENABLED):
+        if azure_endpoint:
+            self.provider = "azure"
+            self.url = f"{azure_endpoint.rstrip('/')}/openai/deployments/{deployment}/chat/completions"
+            self.params = {"api-version": api_version}
+            self.headers = {"api-key": api_key or ""}
+        else:
+            self.provider = "openai"
+            self.url = f"{api_base.rstrip('/')}/chat/completions"
+            self.params = {}
+            self.headers = {"Authorization": f"Bearer {api_key or ''}"}
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.latency = LatencyTracker()
+        self._clients = LoopLocalClient(lambda: httpx.AsyncClient(
+            headers=self.headers,
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                max_keepalive_connections=LLM_MAX_CONNECTIONS),
+        ))
+
+    def get_client(self):
+        return self._clients.get()
+
+    async def close(self):
+        """Close the pooled client for the running event loop (call on shutdown)"""
+        await self._clients.close()
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging, or None while hedging is off or latency unknown"""
+        if not self.hedge:
+            return None
+        p95 = self.latency.quantile(LLM_HEDGE_QUANTILE, LLM_HEDGE_MIN_SAMPLES)
+        return None if p95 is None else max(LLM_HEDGE_MIN_DELAY, p95)
+
+    def stats(self):
+        p95 = self.latency.quantile(LLM_HEDGE_QUANTILE)
+        return {
+            "provider": self.provider,
+            "hedging": self.hedge,
+            "hedge_after_s": self.hedge_delay(),
+            "p95_s": round(p95, 3) if p95 is not None else None,
+        }
+
+    async def chat(self, messages, timeout=None, **params):
+        """Text of the completion for messages, within timeout seconds (LLM_TIMEOUT if None)"""
+        deadline = time.monotonic() + (LLM_TIMEOUT if timeout is None else timeout)
+        payload = {"messages": messages, **params}
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMError("LLM deadline passed")
+            try:
+                data = await self._hedged(payload, remaining)
+                return (data["choices"][0]["message"].get("content") or "").strip()
+            except RetryableError as e:
+                await self._before_retry(attempt, e, deadline)
+
+    async def stream(self, messages, timeout=None, **params):
+        """
+        Yield the completion's text deltas as they arrive. Attempts are
+        retried only until the response starts, and all of them together
+        must start it within timeout seconds; after that, timeout bounds
+        each wait for the next chunk.
+        """
+        read_timeout = LLM_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + read_timeout
+        payload = {"messages": messages, "stream": True, **params}
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMError("LLM deadline passed")
+            client = self.get_client()
+            request = client.build_request(
+                "POST", self.url, params=self.params, json=payload,
+                timeout=httpx.Timeout(read_timeout, connect=min(LLM_CONNECT_TIMEOUT, remaining))
+            )
+            response = None
+            try:
+                response = await asyncio.wait_for(client.send(request, stream=True), timeout=remaining)
+                await self._check(response)
+            except (asyncio.TimeoutError, httpx.TimeoutException):
+                LLM_ATTEMPTS.inc(result="timeout")
+                error = RetryableError(f"no response within {remaining:.2f}s")
+            except httpx.TransportError as e:
+                LLM_ATTEMPTS.inc(result=type(e).__name__)
+                error = RetryableError(repr(e))
+            except RetryableError as e:
+                error = e
+            else:
+                try:
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            return
+                        chunk = json.loads(data)
+                        # Azure sends content-filter chunks with no choices
+                        if not chunk.get("choices"):
+                            continue
+                        content = chunk["choices"][0].get("delta", {}).get("content")
+                        if content:
+                            yield content
+                    return
+                except httpx.TransportError as e:
+                    raise LLMError(f"LLM stream interrupted: {e!r}") from e
+            finally:
+                if response is not None:
+                    await response.aclose()
+            await self._before_retry(attempt, error, deadline)
+
+    async def _before_retry(self, attempt, error, deadline=None):
+        """Sleep before the next attempt, or raise LLMError if there is none to make"""
+        if attempt >= self.max_retries:
+            raise LLMError(f"LLM failed after {attempt + 1} attempts: {error}", error.status)
+        delay = error.retry_after if error.retry_after is not None else backoff_delay(attempt)
+        delay = min(delay, LLM_BACKOFF_MAX)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise LLMError(f"LLM deadline too close to retry after: {error}", error.status)
+        logger.warning("LLM attempt failed, retrying",
+                       extra={"attempt": attempt + 1, "error": str(error), "delay_s": round(delay, 3)})
+        await asyncio.sleep(delay)
+
+    async def _check(self, response):
+        """Raise for a retryable or failed response"""
+        LLM_ATTEMPTS.inc(result=str(response.status_code))
+        if response.status_code in RETRY_STATUS_CODES:
+            raise RetryableError(f"HTTP {response.status_code}", response.status_code, parse_retry_after(response))
+        if response.status_code != 200:
+            await response.aread()
+            raise LLMError(f"HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+
+    async def _attempt(self, payload, timeout):
+        """One request, bounded by timeout seconds in total"""
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self.get_client().post(
+                    self.url, params=self.params, json=payload,
+                    timeout=httpx.Timeout(timeout, connect=min(LLM_CONNECT_TIMEOUT, timeout))
+                ),
+                timeout=timeout
+            )
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            LLM_ATTEMPTS.inc(result="timeout")
+            raise RetryableError(f"timed out after {time.monotonic() - start:.2f}s") from e
+        except httpx.TransportError as e:
+            LLM_ATTEMPTS.inc(result=type(e).__name__)
+            raise RetryableError(repr(e)) from e
+        await self._check(response)
+        self.latency.record(time.monotonic() - start)
+        return response.json()
+
+    async def _hedged(self, payload, timeout):
+        """
+        _attempt, plus a second copy if the first has not answered within
+        the hedge delay; the first success wins and the other is cancelled
+        """
+        delay = self.hedge_delay()
+        if delay is None or delay >= timeout:
+            return await self._attempt(payload, timeout)
+
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self._attempt(payload, timeout))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            LLM_HEDGES.inc(outcome="launched")
+            hedge = asyncio.ensure_future(self._attempt(payload, timeout - (time.monotonic() - start)))
+            pending.add(hedge)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            LLM_HEDGES.inc(outcome="won")
+                        return task.result()
+                    # Keep waiting on the other copy; raise the failure only if both fail
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+llm_client = LLMClient()
@@ -0,0 +1,189 @@
+# backend/onnx_encoder.py
+"""
+ONNX Runtime encoder for the sentence-transformers query/node embedder.
+
+Export once (needs torch and sentence-transformers), optionally with
+dynamic int8 quantization of the weights:
+
+    python -m backend.onnx_encoder export
+    python -m backend.onnx_encoder export --no-quantize
+
+Serving with EMBEDDING_BACKEND=onnx then needs only onnxruntime and
+tokenizers: torch is never imported. Embeddings match the PyTorch model
+within a small tolerance (see benchmarks/encoder_parity.py).
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Where the exported model, tokenizer and encoder config live
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join("graph", "onnx", MODEL_NAME.replace("/", "_")))
+# Serve the int8 model (smaller and faster on CPU) rather than the fp32 export
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "true").lower() == "true"
+# Intra-op threads per session; 0 lets onnxruntime choose
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "encoder.json"
+
+def mean_pool(hidden, attention_mask):
+    """Average token vectors over the real (unpadded) tokens, as the Pooling module does"""
+    mask = attention_mask[..., None].astype(np.float32)
+    return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+class OnnxSentenceEncoder:
+    """
+    Drop-in for the parts of SentenceTransformer the app uses: encode() of
+    a string (one vector) or a list (a matrix), and the embedding size
+    """
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=ONNX_QUANTIZE, threads=ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, CONFIG_FILE), encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.dim = self.config["dimension"]
+        self.normalize = self.config["normalize"]
+        self.quantized = quantized
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        model_path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+
+        # Longest first, so each batch pads to similar lengths
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            positions = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[p] for p in positions])
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": np.array([e.ids for e in encodings], dtype=np.int64), "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            hidden = self.session.run(None, feeds)[0]
+            embeddings[positions] = mean_pool(hidden, mask)
+
+        if self.normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms == 0, 1.0, norms)
+        return embeddings[0] if single else embeddings
+
+def onnx_export_available(model_dir=ONNX_MODEL_DIR, quantized=ONNX_QUANTIZE):
+    """True if the export exists and onnxruntime and tokenizers are installed (nothing is imported)"""
+    model_file = INT8_FILE if quantized else FP32_FILE
+    return (os.path.exists(os.path.join(model_dir, model_file))
+            and importlib.util.find_spec("onnxruntime") is not None
+            and importlib.util.find_spec("tokenizers") is not None)
+
+def load_onnx_encoder(model_dir=ONNX_MODEL_DIR, quantized=ONNX_QUANTIZE):
+    """The exported encoder; raises FileNotFoundError if it has not been exported"""
+    model_file = INT8_FILE if quantized else FP32_FILE
+    if not os.path.exists(os.path.join(model_dir, model_file)):
+        raise FileNotFoundError(
+            f"{model_file} not found in {model_dir}; run: python -m backend.onnx_encoder export"
+        )
+    return OnnxSentenceEncoder(model_dir, quantized)
+
+def export_onnx(model_name=MODEL_NAME, model_dir=ONNX_MODEL_DIR, quantize=True, opset=14):
+    """
+    Export the transformer inside the sentence-transformers model to ONNX
+    (dynamic batch and sequence axes), save its fast tokenizer and the
+    pooling/normalization settings, and optionally write a dynamically
+    int8-quantized copy
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    start = time.perf_counter()
+    st_model = SentenceTransformer(model_name, device="cpu")
+    pooling = st_model[1]
+    if pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"Only mean pooling is supported, {model_name} uses {pooling.get_pooling_mode_str()}")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids)[0]
+
+    os.makedirs(model_dir, exist_ok=True)
+    sample = tokenizer(["Have a break, have a KitKat"], return_tensors="pt", return_token_type_ids=True)
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    fp32_path = os.path.join(model_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    tokenizer.save_pretrained(model_dir)
+
+    config = {
+        "model": model_name,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+        "pad_id": tokenizer.pad_token_id,
+        "pad_token": tokenizer.pad_token,
+    }
+    with open(os.path.join(model_dir, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    print(f"✅ Exported {model_name} to {fp32_path} in {time.perf_counter() - start:.1f}s")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(model_dir, INT8_FILE)
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        fp32_mb, int8_mb = os.path.getsize(fp32_path) / 1e6, os.path.getsize(int8_path) / 1e6
+        print(f"✅ Quantized to {int8_path} ({fp32_mb:.1f} MB -> {int8_mb:.1f} MB)")
+    return model_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--output", default=ONNX_MODEL_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="skip the int8 copy")
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+    export_onnx(args.model, args.output, quantize=not args.no_quantize, opset=args.opset)
+
+if __name__ == "__main__":
+    main()
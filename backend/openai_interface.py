@@ -1,28 +1,20 @@
 # backend/openai_interface.py
 
-import openai
-import os
+import asyncio
 from dotenv import load_dotenv
 
+from backend.llm_client import llm_client
+from backend.metrics import FALLBACKS
+from backend.structured_logging import get_logger
+
 load_dotenv()
 
-# Configure OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+logger = get_logger("openai")
 
-# Check if using Azure OpenAI (optional for future)
-azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-if azure_endpoint:
-    openai.api_type = "azure"
-    openai.api_base = azure_endpoint
-    openai.api_version = "2023-12-01-preview"
+# Provider (OpenAI, or Azure OpenAI when AZURE_OPENAI_ENDPOINT is set),
+# connection pooling, timeouts and retries live in backend/llm_client.py
 
-def ask_openai(question: str, context: str = "") -> str:
-    """
-    Ask OpenAI a question with optional context
-    """
-    try:
-        # Prepare the system message
-        system_message = """You are a helpful AI assistant for Nestlé Canada. You provide accurate information about Nestlé products, services, sustainability practices, and company information.
+SYSTEM_MESSAGE = """You are a helpful AI assistant for Nestlé Canada. You provide accurate information about Nestlé products, services, sustainability practices, and company information.
 
 Key guidelines:
 - Always be friendly and professional
@@ -42,44 +34,86 @@ Popular Nestlé Canada brands include:
 - Carnation (evaporated milk, hot chocolate)
 - Butterfinger (crispy peanut butter bars)"""
 
-        # Prepare the user message
-        user_message = f"""Question: {question}
+def build_messages(question: str, context: str = "") -> list:
+    """
+    Build the chat messages sent to the model for a question and its context
+    """
+    user_message = f"""Question: {question}
 
 Context Information:
 {context}
 
 Please provide a helpful response about Nestlé Canada products, services, or information related to this question."""
 
-        # Make the API call
-        if azure_endpoint:
-            # Azure OpenAI
-            response = openai.ChatCompletion.create(
-                engine=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-35-turbo"),
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=800,
-                temperature=0.7
-            )
-        else:
-            # Standard OpenAI
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=800,
-                temperature=0.7
-            )
-        
-        return response.choices[0].message.content.strip()
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": user_message}
+    ]
+
+def get_completion_params() -> dict:
+    """
+    Model selection and sampling parameters for the configured provider
+    """
+    if llm_client.provider == "azure":
+        # Azure OpenAI picks the model from the deployment in the URL
+        return {
+            "max_tokens": 800,
+            "temperature": 0.7
+        }
+    
+    # Standard OpenAI
+    return {
+        "model": "gpt-3.5-turbo",
+        "max_tokens": 800,
+        "temperature": 0.7
+    }
+
+def ask_openai(question: str, context: str = "") -> str:
+    """
+    Ask OpenAI a question with optional context (blocking; for scripts, not
+    from inside a running event loop)
+    """
+    async def run():
+        try:
+            return await ask_openai_async(question, context)
+        finally:
+            # The pooled client belongs to this temporary event loop
+            await llm_client.close()
+
+    return asyncio.run(run())
+
+async def ask_openai_async(question: str, context: str = "", timeout: float = None) -> str:
+    """
+    Non-blocking variant of ask_openai for the async chat pipeline.
+    A timeout (seconds) bounds the request; running over returns the fallback.
+    """
+    try:
+        return await llm_client.chat(build_messages(question, context), timeout=timeout, **get_completion_params())
     
     except Exception as e:
-        print(f"[ERROR] OpenAI API error: {e}")
+        logger.error("OpenAI API error", extra={"error": str(e), "error_type": type(e).__name__})
+        FALLBACKS.inc(kind="llm_answer")
         return get_fallback_response(question)
 
+async def ask_openai_stream(question: str, context: str = ""):
+    """
+    Stream the answer as text deltas as the completion arrives.
+    Falls back to the canned response if the call fails before any token is
+    produced; a failure mid-stream is raised so the caller can end the stream.
+    """
+    produced = False
+    try:
+        async for content in llm_client.stream(build_messages(question, context), **get_completion_params()):
+            produced = True
+            yield content
+    
+    except Exception as e:
+        logger.error("OpenAI streaming error", extra={"error": str(e), "error_type": type(e).__name__, "streamed": produced})
+        if produced:
+            raise
+        FALLBACKS.inc(kind="llm_answer")
+        yield get_fallback_response(question)
+
 def get_fallback_response(question: str) -> str:
     """
     Provide a fallback response when OpenAI is not available
@@ -149,4 +183,10 @@ Learn more about our sustainability initiatives at **madewithnestle.ca/sustainab
 
 Visit **madewithnestle.ca** to explore our full range of products, recipes, and learn about our commitment to Good Food, Good Life.
 
-How can I help you with Nestlé products today?"""
\ No newline at end of file
+How can I help you with Nestlé products today?"""
+
+def is_fallback_response(question: str, answer: str) -> bool:
+    """
+    True if answer is the canned fallback for question rather than a model answer
+    """
+    return answer == get_fallback_response(question)
@@ -0,0 +1,234 @@
+# backend/process_pool.py
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+
+from backend.metrics import counter, callback_metric
+from backend.structured_logging import get_logger
+
+load_dotenv()
+
+logger = get_logger("process_pool")
+
+# Child processes for CPU-bound work (query encoding, HTML parsing) so one
+# gunicorn worker can use several cores. 0 keeps the work in process.
+COMPUTE_POOL_WORKERS = int(os.getenv("COMPUTE_POOL_WORKERS", "0"))
+# Jobs submitted but not finished; callers beyond this wait for a slot
+COMPUTE_POOL_MAX_PENDING = int(os.getenv("COMPUTE_POOL_MAX_PENDING", str(max(1, COMPUTE_POOL_WORKERS) * 4)))
+# How long (ms) a caller waits for a slot before the job is rejected
+COMPUTE_POOL_WAIT_MS = float(os.getenv("COMPUTE_POOL_WAIT_MS", "2000"))
+# Load the encoder in each child at startup rather than on its first job
+COMPUTE_POOL_PRELOAD_ENCODER = os.getenv("COMPUTE_POOL_PRELOAD_ENCODER", "true").lower() == "true"
+# Math-library threads per child, so children do not oversubscribe the cores
+COMPUTE_POOL_THREADS_PER_WORKER = int(os.getenv("COMPUTE_POOL_THREADS_PER_WORKER", "1"))
+
+POOL_JOBS = counter(
+    "nestle_compute_pool_jobs_total", "Jobs run in the compute process pool, by outcome", ["job", "outcome"])
+
+class ComputePoolBusy(RuntimeError):
+    """No slot freed up within the wait; the caller should degrade rather than queue"""
+
+def _init_worker(preload_encoder, threads):
+    """Runs once in each child before its first job"""
+    if threads:
+        # Must be set before torch / onnxruntime are imported in this process
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "ONNX_THREADS"):
+            os.environ[var] = str(threads)
+    from backend.web_scraper import make_soup
+    make_soup("<p>warm up</p>")
+    if preload_encoder:
+        from backend.retriever import get_model
+        get_model()
+        if threads and "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(threads)
+
+def _ping(delay=0.0):
+    time.sleep(delay)
+    return os.getpid()
+
+class ComputePool:
+    """
+    Process pool with a bounded number of pending jobs. Submitting blocks
+    (threads) or waits (coroutines) for a free slot, up to wait_ms, then
+    raises ComputePoolBusy, so overload turns into backpressure on callers
+    instead of an ever-growing queue. A pool broken by a dead child is
+    replaced in the background; jobs submitted meanwhile are rejected.
+    """
+
+    def __init__(self, workers=COMPUTE_POOL_WORKERS, max_pending=COMPUTE_POOL_MAX_PENDING,
+                 wait_ms=COMPUTE_POOL_WAIT_MS, preload_encoder=COMPUTE_POOL_PRELOAD_ENCODER,
+                 threads_per_worker=COMPUTE_POOL_THREADS_PER_WORKER):
+        self.workers = workers
+        self.max_pending = max(1, max_pending)
+        self.wait = wait_ms / 1000
+        self.preload_encoder = preload_encoder
+        self.threads_per_worker = threads_per_worker
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._restarting = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def start(self):
+        """
+        Spawn the children and wait until each has loaded its encoder and
+        parser. If they cannot start, the pool disables itself (work runs in
+        process again) and None is returned.
+        """
+        # Starts are serialized on their own lock: _lock guards only quick
+        # bookkeeping, which the event loop must never wait behind
+        with self._start_lock:
+            if self._executor is None and self.enabled and not self._closed:
+                start = time.perf_counter()
+                # spawn, not fork: the parent runs threads (logging, batching) that fork would copy mid-flight
+                executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.preload_encoder, self.threads_per_worker),
+                )
+                try:
+                    # Ping until every child has answered, i.e. finished its
+                    # initializer; a ready child would otherwise take all pings
+                    pids = set()
+                    while len(pids) < self.workers:
+                        pids |= {f.result() for f in [executor.submit(_ping, 0.05) for _ in range(self.workers)]}
+                except Exception as e:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    print(f"⚠️ Compute pool failed to start ({e}), running CPU work in process")
+                    self.workers = 0
+                    return None
+                with self._lock:
+                    self._executor = executor
+                print(f"✅ Compute pool started with {len(pids)} workers "
+                      f"in {time.perf_counter() - start:.2f}s")
+            return self._executor
+
+    def submit(self, fn, *args):
+        """Run fn(*args) in a child, blocking up to the wait for a slot; returns a Future"""
+        if not self._slots.acquire(timeout=self.wait):
+            self._reject(fn)
+        return self._submit(fn, args)
+
+    async def run(self, fn, *args):
+        """
+        Await fn(*args) in a child without blocking the event loop. Runs
+        inline when the pool is disabled.
+        """
+        if not self.enabled:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            # Saturated: wait for a slot off the loop, bounded by the wait
+            acquire = asyncio.ensure_future(asyncio.to_thread(self._slots.acquire, True, self.wait))
+            try:
+                acquired = await asyncio.shield(acquire)
+            except asyncio.CancelledError:
+                # The thread may still get the slot after the caller gave up; hand it back
+                acquire.add_done_callback(self._release_abandoned)
+                raise
+            if not acquired:
+                self._reject(fn)
+        return await asyncio.wrap_future(self._submit(fn, args))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _reject(self, fn):
+        self.rejected += 1
+        POOL_JOBS.inc(job=fn.__name__, outcome="rejected")
+        raise ComputePoolBusy(f"{self.max_pending} compute jobs pending for {self.wait:.1f}s")
+
+    def _release_abandoned(self, acquire):
+        if not acquire.cancelled() and acquire.exception() is None and acquire.result():
+            self._slots.release()
+
+    def _restart_in_background(self):
+        """
+        Start a fresh pool on a thread: spawning children and loading their
+        encoders takes seconds and must not stall the event loop
+        """
+        with self._lock:
+            if self._restarting or self._executor is not None or not self.enabled or self._closed:
+                return
+            self._restarting = True
+
+        def restart():
+            try:
+                self.start()
+            finally:
+                self._restarting = False
+
+        threading.Thread(target=restart, name="compute-pool-restart", daemon=True).start()
+
+    def _submit(self, fn, args):
+        """Submit with a slot already held; the slot is released when the job finishes"""
+        try:
+            executor = self._executor
+            if executor is None:
+                self._restart_in_background()
+                raise ComputePoolBusy("compute pool is not running")
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard(executor)
+            raise ComputePoolBusy("compute pool is restarting")
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.pending += 1
+        future.add_done_callback(lambda done: self._finish(fn, executor, done))
+        return future
+
+    def _finish(self, fn, executor, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+        self._slots.release()
+        error = None if future.cancelled() else future.exception()
+        POOL_JOBS.inc(job=fn.__name__, outcome="ok" if error is None else "error")
+        if isinstance(error, BrokenProcessPool):
+            self._discard(executor)
+
+    def _discard(self, executor):
+        """Drop a broken executor and start its replacement"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        logger.error("Compute pool broke (a worker died); restarting it")
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._restart_in_background()
+
+compute_pool = ComputePool()
+
+callback_metric("nestle_compute_pool_pending", "Jobs submitted to the compute pool and not finished",
+                lambda: [({}, compute_pool.pending)] if compute_pool.enabled else [])
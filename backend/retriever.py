@@ -1,88 +1,450 @@
 # backend/retriever.py
 
-import pickle
+import asyncio
+import hashlib
+import queue
+import threading
+import time
+from concurrent.futures import Future
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import os
 
-# Initialize the sentence transformer model
-try:
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    print("✅ Sentence transformer model loaded successfully")
-except Exception as e:
-    print(f"❌ Error loading sentence transformer: {e}")
-    model = None
+from backend.vector_index import VECTOR_INDEX_BACKEND, create_index, load_index, read_index_meta, normalize_rows
+from backend.graph_store import GRAPH_DB_PATH, LEGACY_GRAPH_PATH, open_store
+from backend.graph_csr import get_csr
+from backend.graph_rank import GRAPH_RERANK_ENABLED, GRAPH_RERANK_CANDIDATES, rerank_nodes
+from backend.structured_logging import get_logger, preview
+from backend.metrics import histogram
+from backend.onnx_encoder import ONNX_QUANTIZE, load_onnx_encoder, onnx_export_available
+from backend.process_pool import ComputePoolBusy, compute_pool
 
-def load_graph():
-    """Load the knowledge graph from pickle file"""
-    graph_path = os.path.join("graph", "graph.pkl")
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "torch" runs the SentenceTransformer; "onnx" runs its ONNX export (backend/onnx_encoder.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
+def resolve_embedding_backend():
+    """The backend get_model will load: ONNX only if it was asked for and the export can run"""
+    if EMBEDDING_BACKEND != "onnx":
+        return "torch"
+    if onnx_export_available():
+        return "onnx"
+    print("⚠️ ONNX export or runtime not found, using the PyTorch encoder (run: python -m backend.onnx_encoder export)")
+    return "torch"
+
+# Decided once, before anything is cached or indexed, so ENCODER_ID always
+# names the encoder that produced the vectors
+ACTIVE_EMBEDDING_BACKEND = resolve_embedding_backend()
+# Identifies the vectors an encoder produces. Backends agree only within a
+# tolerance, so each keeps its own cached embeddings and node index.
+ENCODER_ID = MODEL_NAME if ACTIVE_EMBEDDING_BACKEND != "onnx" else f"{MODEL_NAME}@onnx{'-int8' if ONNX_QUANTIZE else ''}"
+NODE_INDEX_PATH = os.path.join("graph", "node_index")
+
+# Concurrent query encodes are gathered into one batched forward pass
+EMBED_BATCH_ENABLED = os.getenv("EMBED_BATCH_ENABLED", "true").lower() == "true"
+# Largest batch, and how long (ms) the first query waits for others to join it
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "3"))
+
+EMBED_BATCH_SIZE = histogram(
+    "nestle_embed_batch_size", "Queries encoded per batched forward pass", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+logger = get_logger("retriever")
+
+# The sentence transformer (and torch behind it) is imported on first use,
+# so importing this module stays cheap and startup can defer the load
+_model = None
+_model_failed = False
+_model_lock = threading.Lock()
+
+def get_model():
+    """Return the shared sentence transformer, loading it on first call"""
+    global _model, _model_failed
+    if _model is not None or _model_failed:
+        return _model
     
-    if not os.path.exists(graph_path):
-        print(f"❌ Graph file not found at {graph_path}")
-        raise FileNotFoundError(f"Graph file not found at {graph_path}")
+    with _model_lock:
+        if _model is None and not _model_failed:
+            start = time.perf_counter()
+            if ACTIVE_EMBEDDING_BACKEND == "onnx":
+                # No PyTorch fallback here: its vectors would be cached and indexed under the ONNX ENCODER_ID
+                try:
+                    _model = load_onnx_encoder()
+                    print(f"✅ ONNX encoder ({'int8' if ONNX_QUANTIZE else 'fp32'}) loaded in {time.perf_counter() - start:.2f}s")
+                except Exception as e:
+                    print(f"❌ Error loading ONNX encoder: {e}")
+                    _model_failed = True
+                return _model
+            try:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(MODEL_NAME)
+                print(f"✅ Sentence transformer model loaded in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                print(f"❌ Error loading sentence transformer: {e}")
+                _model_failed = True
+    return _model
+
+def is_model_loaded():
+    """True once get_model() has finished loading the encoder"""
+    return _model is not None
+
+def load_graph():
+    """
+    Load the knowledge graph from the graph store (nodes, descriptions and
+    adjacency only), migrating a legacy graph.pkl the first time
+    """
+    if not os.path.exists(GRAPH_DB_PATH) and not os.path.exists(LEGACY_GRAPH_PATH):
+        print(f"❌ Graph store not found at {GRAPH_DB_PATH}")
+        raise FileNotFoundError(f"Graph store not found at {GRAPH_DB_PATH}")
     
     try:
-        with open(graph_path, "rb") as f:
-            graph = pickle.load(f)
+        graph = open_store().load_graph()
         print(f"✅ Graph loaded with {graph.number_of_nodes()} nodes")
         return graph
     except Exception as e:
         print(f"❌ Error loading graph: {e}")
         raise e
 
-def embed_nodes(G):
-    """Create embeddings for all nodes in the graph"""
+def node_text(G, node):
+    """Text used to embed a node: its description, or its name if it has none"""
+    desc = G.nodes[node].get('description', '')
+    return desc if desc else str(node)
+
+def embedding_key(text, model_name=ENCODER_ID):
+    """Content hash identifying an embedding of text under a given model"""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+def embed_nodes(G, store=None):
+    """
+    Create embeddings for all nodes in the graph.
+    Vectors are cached in the graph store by content hash, so only new or
+    changed node texts are encoded, all in a single batched call.
+    """
+    model = get_model()
     if not model:
         print("❌ Sentence transformer model not available")
-        return {}
+        return None
     
     try:
-        embeddings = {}
-        print("📊 Creating node embeddings...")
+        node_ids = list(G.nodes)
+        keys = [embedding_key(node_text(G, node)) for node in node_ids]
         
-        for node in G.nodes:
-            desc = G.nodes[node].get('description', '')
-            if desc:
-                embeddings[node] = model.encode(desc)
-            else:
-                # Use node name if no description
-                embeddings[node] = model.encode(str(node))
+        store = store or open_store()
+        cached = store.get_embeddings(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
         
-        print(f"✅ Created embeddings for {len(embeddings)} nodes")
-        return embeddings
+        if missing:
+            print(f"📊 Creating embeddings for {len(missing)} of {len(node_ids)} nodes...")
+            texts = [node_text(G, node_ids[i]) for i in missing]
+            vectors = model.encode(texts, batch_size=64, convert_to_numpy=True)
+            new_vectors = {keys[i]: np.asarray(vector, dtype=np.float32) for i, vector in zip(missing, vectors)}
+            store.put_embeddings(new_vectors)
+            cached.update(new_vectors)
+            
+            # Keep only vectors for the current graph so the store does not grow forever
+            store.prune_embeddings(keys)
+        else:
+            print(f"📦 Loaded all {len(node_ids)} node embeddings from cache")
+        
+        index = create_index().build(node_ids, np.stack([cached[key] for key in keys]))
+        print(f"✅ Created {index.backend} index with embeddings for {len(index)} nodes")
+        return index
     except Exception as e:
         print(f"❌ Error creating embeddings: {e}")
-        return {}
+        return None
 
-def get_top_nodes(query, G, node_embeddings, k=3):
-    """Get the top k most relevant nodes for a given query"""
-    if not model or not node_embeddings:
-        print("❌ Model or embeddings not available")
-        return []
-    
+def graph_fingerprint(G, model_name=ENCODER_ID):
+    """Hash of every node's embedding key, used to detect a stale index file"""
+    digest = hashlib.sha256()
+    for node in G.nodes:
+        digest.update(embedding_key(node_text(G, node), model_name).encode("ascii"))
+    return digest.hexdigest()
+
+def write_node_index(index, G, path=NODE_INDEX_PATH):
+    """
+    Write an index once for all workers to share: the vectors (a raw float32
+    matrix, or a FAISS index file) plus a JSON sidecar (<path>.json) holding
+    node ids, shape, backend and a graph fingerprint
+    """
+    index.save(path, meta={"model": ENCODER_ID, "fingerprint": graph_fingerprint(G)})
+    print(f"💾 {index.backend} node index written to {path} ({len(index)} x {index.dim})")
+
+def load_node_index(G=None, path=NODE_INDEX_PATH):
+    """
+    Open the shared node index. Numpy indexes are memory-mapped read-only
+    with np.memmap, so every worker process maps the same page-cached
+    vectors instead of holding a copy. Returns None if the files are
+    missing, were built for another model or backend, or do not match the graph.
+    """
     try:
-        # Encode the query
-        query_emb = model.encode(query)
+        meta = read_index_meta(path)
+        if meta is None:
+            return None
         
-        # Calculate similarities
-        similarities = {}
-        for node, emb in node_embeddings.items():
-            if node in G.nodes:  # Ensure node still exists in graph
-                similarity = np.dot(query_emb, emb) / (
-                    np.linalg.norm(query_emb) * np.linalg.norm(emb)
-                )
-                similarities[node] = similarity
+        if meta.get("model") != ENCODER_ID:
+            print(f"⚠️ Node index was built with {meta.get('model')}, expected {ENCODER_ID}")
+            return None
+        if meta.get("backend", "numpy") != VECTOR_INDEX_BACKEND:
+            print(f"⚠️ Node index uses the {meta.get('backend', 'numpy')} backend, expected {VECTOR_INDEX_BACKEND}")
+            return None
+        if G is not None and meta.get("fingerprint") != graph_fingerprint(G):
+            print("⚠️ Node index is stale for the current graph")
+            return None
+        if meta["shape"][0] == 0:
+            return None
         
-        # Sort by similarity and return top k
-        top_nodes = sorted(similarities.keys(), key=lambda x: similarities[x], reverse=True)[:k]
+        index = load_index(path, meta)
+        print(f"📦 Opened {index.backend} node index with {len(index)} nodes")
+        return index
+    except Exception as e:
+        print(f"⚠️ Could not open node index {path}: {e}")
+        return None
+
+def build_node_index(G=None, path=NODE_INDEX_PATH):
+    """Embed the graph and write the shared index file, then map it back in"""
+    if G is None:
+        G = load_graph()
+    
+    index = embed_nodes(G)
+    if index is None:
+        return None
+    
+    write_node_index(index, G, path)
+    return load_node_index(G, path) or index
+
+def _filter_nodes(positions, G, node_embeddings):
+    return [node_embeddings.node_ids[p] for p in positions if p >= 0 and node_embeddings.node_ids[p] in G.nodes]
+
+def _select_nodes(positions, query_emb, G, node_embeddings, k):
+    """Top k node ids from one row of search results, skipping nodes no longer in G"""
+    top_nodes = _filter_nodes(positions, G, node_embeddings)
+    if len(top_nodes) < k and len(positions) < len(node_embeddings):
+        # Some of the winners were removed from the graph; fall back to a full ranking
+        _, positions = node_embeddings.search(query_emb, len(node_embeddings))
+        top_nodes = _filter_nodes(positions[0], G, node_embeddings)
+    return top_nodes[:k]
+
+def _rank_nodes(scores, positions, query_emb, G, node_embeddings, k, rerank):
+    """Top k nodes from one row of search results, re-ranked over the graph if asked"""
+    if rerank:
+        pairs = [(node_embeddings.node_ids[p], float(s)) for s, p in zip(scores, positions)
+                 if p >= 0 and node_embeddings.node_ids[p] in G.nodes]
+        if pairs:
+            try:
+                nodes, sims = zip(*pairs)
+                return rerank_nodes(list(nodes), list(sims), G, k)
+            except Exception:
+                logger.warning("Graph re-ranking failed, using similarity order", exc_info=True)
+    return _select_nodes(positions, query_emb, G, node_embeddings, k)
+
+class EmbeddingBatcher:
+    """
+    Collects query encodes from concurrent callers and runs them as one
+    batched model.encode on a single worker thread (or, with the compute
+    pool enabled, in its child processes). Under load the first
+    query of a batch waits up to wait_ms for others, and a batch closes
+    early at max_batch; a lone query after an idle spell runs at once, so
+    light traffic does not pay the window. Callers get a
+    concurrent.futures.Future per query, so both threads (result()) and
+    coroutines (asyncio.wrap_future) can wait on it.
+    """
+
+    def __init__(self, max_batch=EMBED_BATCH_MAX_SIZE, wait_ms=EMBED_BATCH_WAIT_MS):
+        self.max_batch = max(1, max_batch)
+        self.wait = max(0.0, wait_ms) / 1000
+        self.batches = 0
+        self.queries = 0
+        self._last_batch = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, query):
+        """Future resolving to the normalized embedding of query (None without a model)"""
+        future = Future()
+        self._queue.put((query, future))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+        return future
+
+    def encode(self, query):
+        return self.submit(query).result()
+
+    async def encode_async(self, query):
+        return await asyncio.wrap_future(self.submit(query))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        # Queries that arrived while the previous batch ran are taken anyway;
+        # only wait for more if the last batch shows concurrent traffic
+        deadline = time.perf_counter() + (self.wait if self._last_batch > 1 else 0.0)
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that gave up (cancelled futures) are dropped from the batch
+            batch = [(query, future) for query, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [query for query, _ in batch]
+            if compute_pool.enabled:
+                # Hand the batch to a child and collect the next one meanwhile;
+                # while every slot is busy, queries pile up into a bigger batch
+                try:
+                    job = compute_pool.submit(encode_texts, texts)
+                except Exception as e:
+                    self._fail(batch, e)
+                    continue
+                job.add_done_callback(lambda done, batch=batch: self._resolve(batch, done))
+                continue
+            try:
+                vectors = encode_texts(texts)
+            except Exception as e:
+                self._fail(batch, e)
+                continue
+            self._deliver(batch, vectors)
+
+    def _resolve(self, batch, job):
+        # Jobs still queued when the pool shuts down are cancelled
+        error = ComputePoolBusy("compute pool shut down") if job.cancelled() else job.exception()
+        if error is not None:
+            self._fail(batch, error)
+        else:
+            self._deliver(batch, job.result())
+
+    def _fail(self, batch, error):
+        for _, future in batch:
+            future.set_exception(error)
+
+    def _deliver(self, batch, vectors):
+        self.batches += 1
+        self.queries += len(batch)
+        self._last_batch = len(batch)
+        EMBED_BATCH_SIZE.observe(len(batch))
+        if vectors is None:
+            vectors = [None] * len(batch)
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+def encode_texts(texts):
+    """
+    Normalized float32 embeddings of texts, or None if the model is
+    unavailable. Module-level so compute pool children can run it.
+    """
+    model = get_model()
+    if model is None:
+        return None
+    return normalize_rows(model.encode(list(texts)))
+
+embedding_batcher = EmbeddingBatcher() if EMBED_BATCH_ENABLED else None
+
+def encode_query(query):
+    """Normalized float32 embedding of a query, or None if the model is unavailable"""
+    if embedding_batcher is not None:
+        return embedding_batcher.encode(query)
+    if compute_pool.enabled:
+        vectors = compute_pool.submit(encode_texts, [query]).result()
+        return None if vectors is None else vectors[0]
+    model = get_model()
+    if not model:
+        return None
+    return normalize_rows(model.encode(query))
+
+def encode_queries(queries):
+    """
+    encode_query for several queries, as a (len(queries), dim) matrix or None
+    if the model is unavailable. Goes through the same batcher and compute
+    pool admission control as single queries.
+    """
+    queries = list(queries)
+    if embedding_batcher is not None:
+        # Submitted together, the queries join the same batch (or a few, past max_batch)
+        vectors = [future.result() for future in [embedding_batcher.submit(query) for query in queries]]
+        return None if any(vector is None for vector in vectors) else np.stack(vectors)
+    if compute_pool.enabled:
+        return compute_pool.submit(encode_texts, queries).result()
+    return encode_texts(queries)
+
+async def encode_query_async(query):
+    """
+    encode_query for coroutines: joins the current batch without holding a
+    thread while it waits
+    """
+    if embedding_batcher is not None:
+        return await embedding_batcher.encode_async(query)
+    return await asyncio.to_thread(encode_query, query)
+
+def get_top_nodes(query, G, node_embeddings, k=3, query_emb=None, rerank=None):
+    """
+    Get the top k most relevant nodes for a given query.
+    Pass query_emb to reuse an embedding already computed by encode_query.
+    Unless rerank is False, the similarity candidates are re-ranked with
+    personalized PageRank over the graph (GRAPH_RERANK_ENABLED).
+    """
+    rerank = GRAPH_RERANK_ENABLED if rerank is None else rerank
+    if not node_embeddings:
+        logger.warning("Node embeddings not available")
+        return []
+    
+    try:
+        # Encode the query and search the configured vector index
+        if query_emb is None:
+            query_emb = encode_query(query)
+        if query_emb is None:
+            logger.warning("Sentence transformer model not available")
+            return []
+        pool = max(k, GRAPH_RERANK_CANDIDATES) if rerank else k
+        scores, positions = node_embeddings.search(query_emb, pool)
+        top_nodes = _rank_nodes(scores[0], positions[0], query_emb, G, node_embeddings, k, rerank)
         
-        print(f"🔍 Found {len(top_nodes)} relevant nodes for query: '{query}'")
+        logger.debug("Found relevant nodes", extra={"query": preview(query), "nodes": top_nodes})
         return top_nodes
     
-    except Exception as e:
-        print(f"❌ Error finding relevant nodes: {e}")
+    except Exception:
+        logger.exception("Error finding relevant nodes")
         return []
 
+def get_top_nodes_batch(queries, G, node_embeddings, k=3, rerank=None):
+    """Get the top k nodes for each of several queries with a single matmul"""
+    rerank = GRAPH_RERANK_ENABLED if rerank is None else rerank
+    queries = list(queries)
+    if not queries:
+        return []
+    if not node_embeddings:
+        logger.warning("Node embeddings not available")
+        return [[] for _ in queries]
+    
+    try:
+        query_embs = encode_queries(queries)
+        if query_embs is None:
+            logger.warning("Sentence transformer model not available")
+            return [[] for _ in queries]
+        pool = max(k, GRAPH_RERANK_CANDIDATES) if rerank else k
+        scores, positions = node_embeddings.search(query_embs, pool)
+        return [
+            _rank_nodes(score_row, row, query_emb, G, node_embeddings, k, rerank)
+            for score_row, row, query_emb in zip(scores, positions, query_embs)
+        ]
+    
+    except Exception:
+        logger.exception("Error finding relevant nodes")
+        return [[] for _ in queries]
+
 def get_node_context(node, G, max_description_length=200):
     """Get formatted context for a specific node"""
     if node not in G.nodes:
@@ -97,24 +459,34 @@ def get_node_context(node, G, max_description_length=200):
     return description
 
 def get_connected_nodes(node, G, depth=1):
-    """Get nodes connected to the given node up to specified depth"""
-    if node not in G.nodes:
+    """Get nodes connected to the given node up to specified depth, strongest first"""
+    csr = get_csr(G)
+    if node not in csr:
         return []
     
-    connected = set()
-    current_level = {node}
-    
-    for _ in range(depth):
-        next_level = set()
-        for current_node in current_level:
-            neighbors = set(G.neighbors(current_node))
-            next_level.update(neighbors)
-            connected.update(neighbors)
-        current_level = next_level
+    positions, hops, scores = csr.expand(csr.positions([node]), depth=depth)
+    # Closer hops first, then by accumulated edge weight
+    order = np.lexsort((-scores, hops))
+    return [csr.node_ids[i] for i in positions[order]]
+
+def rank_related_nodes(seed_nodes, G, depth=1, decay=0.5):
+    """
+    Expand all seed nodes at once and score every node reached, weighting
+    each seed by its rank. Returns {node: score}; nodes linked to several
+    top-ranked seeds by strong edges score highest.
+    """
+    csr = get_csr(G)
+    seeds = [node for node in seed_nodes if node in csr]
+    if not seeds:
+        return {}
     
-    return list(connected)
+    seed_weights = 1.0 / (1.0 + np.arange(len(seeds), dtype=np.float32))
+    positions, _, scores = csr.expand(csr.positions(seeds), depth=depth,
+                                      seed_weights=seed_weights, decay=decay)
+    return dict(zip(csr.node_ids[positions], scores.tolist()))
 
-def search_graph_content(query, G, node_embeddings, max_results=5, include_connected=True):
+def search_graph_content(query, G, node_embeddings, max_results=5, include_connected=True,
+                         related_per_node=2, query_emb=None):
     """
     Comprehensive search of graph content
     """
@@ -123,7 +495,9 @@ def search_graph_content(query, G, node_embeddings, max_results=5, include_conne
     
     try:
         # Get top relevant nodes
-        top_nodes = get_top_nodes(query, G, node_embeddings, k=max_results)
+        top_nodes = get_top_nodes(query, G, node_embeddings, k=max_results, query_emb=query_emb)
+        related_scores = rank_related_nodes(top_nodes, G) if include_connected else {}
+        csr = get_csr(G)
         
         context_parts = []
         processed_nodes = set()
@@ -137,17 +511,22 @@ def search_graph_content(query, G, node_embeddings, max_results=5, include_conne
             context_parts.append(f"**{node}**: {description}")
             processed_nodes.add(node)
             
-            # Optionally include connected nodes for richer context
-            if include_connected:
-                connected = get_connected_nodes(node, G, depth=1)
-                for connected_node in connected[:2]:  # Limit to avoid too much text
-                    if connected_node not in processed_nodes:
-                        connected_desc = get_node_context(connected_node, G, max_description_length=100)
-                        context_parts.append(f"*Related - {connected_node}*: {connected_desc}")
-                        processed_nodes.add(connected_node)
+            # Optionally include the best-ranked neighbours for richer context
+            if include_connected and node in csr:
+                neighbours, weights = csr.neighbours(csr.position(node))
+                candidates = [
+                    (related_scores.get(csr.node_ids[i], 0.0), float(w), csr.node_ids[i])
+                    for i, w in zip(neighbours, weights)
+                    if csr.node_ids[i] not in processed_nodes and csr.node_ids[i] not in top_nodes
+                ]
+                candidates.sort(key=lambda c: (-c[0], -c[1]))
+                for _, _, connected_node in candidates[:related_per_node]:  # Limit to avoid too much text
+                    connected_desc = get_node_context(connected_node, G, max_description_length=100)
+                    context_parts.append(f"*Related - {connected_node}*: {connected_desc}")
+                    processed_nodes.add(connected_node)
         
         return "\n".join(context_parts)
     
-    except Exception as e:
-        print(f"❌ Error searching graph content: {e}")
-        return ""
\ No newline at end of file
+    except Exception:
+        logger.exception("Error searching graph content")
+        return ""
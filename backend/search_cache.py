@@ -0,0 +1,233 @@
+# backend/search_cache.py
+
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from dotenv import load_dotenv
+
+from backend.structured_logging import get_logger
+
+load_dotenv()
+
+logger = get_logger("search_cache")
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+# Optional SQLite file that keeps the cache warm across restarts and workers
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "")
+# Rows kept in the SQLite file; expired rows go first, then the soonest to expire
+SEARCH_CACHE_DB_SIZE = int(os.getenv("SEARCH_CACHE_DB_SIZE", "10000"))
+# How often (seconds) a process prunes the SQLite file, checked on writes
+SEARCH_CACHE_PRUNE_INTERVAL = float(os.getenv("SEARCH_CACHE_PRUNE_INTERVAL", "300"))
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(query):
+    """Case-fold and collapse punctuation and whitespace so equivalent questions share a key"""
+    text = _PUNCTUATION.sub(" ", query.casefold())
+    return _WHITESPACE.sub(" ", text).strip()
+
+class SQLiteCacheBackend:
+    """
+    On-disk store for cache entries, shared safely between processes.
+    Writes periodically prune expired rows and cap the table at max_rows,
+    so keys that are never read again do not pile up.
+    """
+
+    def __init__(self, path, max_rows=SEARCH_CACHE_DB_SIZE, prune_interval=SEARCH_CACHE_PRUNE_INTERVAL):
+        self.path = path
+        self.max_rows = max_rows
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache "
+                "(key TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS search_cache_expires ON search_cache (expires)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def load(self, key):
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT expires, value FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def store(self, key, expires, value):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, expires, value) VALUES (?, ?, ?)",
+                (key, expires, json.dumps(value))
+            )
+        if time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + self.prune_interval
+            self.prune()
+
+    def prune(self, now=None):
+        """Delete expired rows, then the soonest to expire beyond max_rows; returns how many"""
+        now = time.time() if now is None else now
+        with closing(self._connect()) as conn, conn:
+            removed = conn.execute("DELETE FROM search_cache WHERE expires <= ?", (now,)).rowcount
+            excess = conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0] - self.max_rows
+            if excess > 0:
+                removed += conn.execute(
+                    "DELETE FROM search_cache WHERE key IN "
+                    "(SELECT key FROM search_cache ORDER BY expires LIMIT ?)", (excess,)
+                ).rowcount
+        if removed:
+            logger.debug("Search cache pruned", extra={"removed": removed})
+        return removed
+
+    def delete(self, key):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM search_cache")
+
+class SearchCache:
+    """
+    In-memory TTL + LRU cache for search results keyed by normalized query,
+    with an optional persistent backend consulted on memory misses
+    """
+
+    def __init__(self, max_entries=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query, num_results):
+        return f"{num_results}:{normalize_query(query)}"
+
+    def get(self, query, num_results):
+        """Cached results for the query, or None on a miss or expiry"""
+        key = self.make_key(query, num_results)
+        cached = self._get_from_memory(key)
+        if cached is not None:
+            return cached
+        return self._finish_lookup(key, self._load_from_backend(key))
+
+    async def get_async(self, query, num_results):
+        """get for the event loop: memory hits answer inline, backend reads run on a thread"""
+        key = self.make_key(query, num_results)
+        cached = self._get_from_memory(key)
+        if cached is not None:
+            return cached
+        entry = await asyncio.to_thread(self._load_from_backend, key) if self.backend is not None else None
+        return self._finish_lookup(key, entry)
+
+    def set(self, query, num_results, results):
+        key, expires, value = self._set_in_memory(query, num_results, results)
+        self._store_in_backend(key, expires, value)
+
+    async def set_async(self, query, num_results, results):
+        """set for the event loop: the backend write runs on a thread"""
+        key, expires, value = self._set_in_memory(query, num_results, results)
+        if self.backend is not None:
+            await asyncio.to_thread(self._store_in_backend, key, expires, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+    def _put(self, key, expires, value):
+        """Insert under the lock, evicting least recently used entries past max_entries"""
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_from_memory(self, key):
+        """Live in-memory results for key (counted as a hit), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(value)
+                del self._entries[key]
+        return None
+
+    def _finish_lookup(self, key, entry):
+        """Promote a backend entry into memory and count the hit, or count the miss"""
+        with self._lock:
+            if entry is not None:
+                self._put(key, *entry)
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+            return None
+
+    def _set_in_memory(self, query, num_results, results):
+        key = self.make_key(query, num_results)
+        expires = time.time() + self.ttl
+        value = list(results)
+        with self._lock:
+            self._put(key, expires, value)
+        return key, expires, value
+
+    def _load_from_backend(self, key):
+        """Live backend entry for key, deleting it if it has expired"""
+        if self.backend is None:
+            return None
+        try:
+            entry = self.backend.load(key)
+        except Exception as e:
+            logger.warning("Search cache backend read failed", extra={"error": str(e)})
+            return None
+        if entry is not None and entry[0] <= time.time():
+            self._delete_from_backend(key)
+            return None
+        return entry
+
+    def _store_in_backend(self, key, expires, value):
+        if self.backend is None:
+            return
+        try:
+            self.backend.store(key, expires, value)
+        except Exception as e:
+            logger.warning("Search cache backend write failed", extra={"error": str(e)})
+
+    def _delete_from_backend(self, key):
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            logger.warning("Search cache backend delete failed", extra={"error": str(e)})
+
+search_cache = SearchCache(
+    backend=SQLiteCacheBackend(SEARCH_CACHE_PATH) if SEARCH_CACHE_PATH else None
+)
@@ -0,0 +1,74 @@
+# backend/single_flight.py
+
+import asyncio
+import os
+from dotenv import load_dotenv
+
+from backend.metrics import counter
+from backend.search_cache import normalize_query
+
+load_dotenv()
+
+# Share one in-progress computation between concurrent identical questions
+CHAT_COALESCING_ENABLED = os.getenv("CHAT_COALESCING_ENABLED", "true").lower() == "true"
+
+COALESCED_CALLS = counter(
+    "nestle_single_flight_total", "Calls that ran a computation (executed) or joined one in flight (coalesced)",
+    ["group", "outcome"])
+
+class SingleFlight:
+    """
+    Deduplicate concurrent async calls by key: the first caller starts the
+    computation, callers arriving while it is in flight await the same task
+    and receive its result (or exception). Nothing is kept once it finishes,
+    so this is not a cache.
+    """
+
+    def __init__(self, group, enabled=True):
+        self.group = group
+        self.enabled = enabled
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+
+    async def run(self, key, factory):
+        """Await factory() for key, joining a call already in flight for the same key"""
+        if not self.enabled:
+            self._count("executed")
+            return await factory()
+
+        task = self._calls.get(key)
+        if task is None:
+            self._count("executed")
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self._count("coalesced")
+        # A caller that disconnects must not cancel the work the others wait on
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+    def _count(self, outcome):
+        if outcome == "executed":
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        COALESCED_CALLS.inc(group=self.group, outcome=outcome)
+
+    def _finish(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception so it is not reported as unhandled when
+        # every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+def question_key(question):
+    """Coalescing key: the question as normalized for the search cache"""
+    return normalize_query(question)
@@ -0,0 +1,221 @@
+# backend/structured_logging.py
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+import zlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_FILE = os.getenv("LOG_FILE", "chatbot.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# RotatingFileHandler is not multi-process safe: two workers rotating the same
+# file rename it under each other. "auto" gives each process its own file
+# (chatbot.<pid>.log) when running under gunicorn; "true"/"false" force it
+LOG_FILE_PER_PROCESS = os.getenv("LOG_FILE_PER_PROCESS", "auto").lower()
+# Also write JSON lines to stdout (the Azure log stream); the write happens
+# on the listener thread, never on a request thread
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "true").lower() == "true"
+# Records waiting for the writer thread; beyond this new records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of requests whose records are kept, per level, e.g. "DEBUG:0.05,INFO:1".
+# WARNING and above are always kept
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "DEBUG:0.1,INFO:1")
+# User questions are truncated to this many characters in log records
+LOG_QUERY_CHARS = int(os.getenv("LOG_QUERY_CHARS", "80"))
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+def get_request_id():
+    return request_id_var.get()
+
+def preview(text, limit=None):
+    """Shorten user text before it goes into a log record"""
+    limit = LOG_QUERY_CHARS if limit is None else limit
+    text = str(text)
+    return text if len(text) <= limit else text[:limit] + "…"
+
+def get_logger(name):
+    """Logger under the application's namespace, e.g. get_logger("retriever")"""
+    return logging.getLogger(f"nestle.{name}")
+
+def parse_sample_rates(spec):
+    rates = {}
+    for part in spec.split(","):
+        level, _, rate = part.partition(":")
+        if level.strip() and rate.strip():
+            rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request id and extra fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request id; runs in the calling thread, before the queue"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of records per level. The decision is made per request
+    id, so a sampled request keeps all of its records at that level.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            return (zlib.crc32(f"{request_id}:{record.levelno}".encode()) % 10000) < rate * 10000
+        return random.random() < rate
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the writer thread without ever blocking the caller.
+    When the queue is full the record is dropped and counted instead.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback now, while args are still valid,
+        # but keep extra fields as attributes for the JSON formatter
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+def log_file_path(log_dir=LOG_DIR, per_process=LOG_FILE_PER_PROCESS):
+    """Where this process writes its log file"""
+    if per_process == "auto":
+        # gunicorn workers have it imported; a single uvicorn process does not
+        per_process = "gunicorn" in sys.modules
+    elif isinstance(per_process, str):
+        per_process = per_process == "true"
+    if not per_process:
+        return os.path.join(log_dir, LOG_FILE)
+    stem, ext = os.path.splitext(LOG_FILE)
+    return os.path.join(log_dir, f"{stem}.{os.getpid()}{ext}")
+
+def setup_logging(level=LOG_LEVEL, log_dir=LOG_DIR, console=LOG_CONSOLE):
+    """
+    Route the application's loggers through a bounded queue to a rotating
+    JSON log file in log_dir (and stdout), one file per process under
+    gunicorn. Safe to call more than once.
+    """
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            return _queue_handler
+
+        formatter = JsonFormatter()
+        handlers = []
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            handlers.append(logging.handlers.RotatingFileHandler(
+                log_file_path(log_dir), maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            ))
+        except OSError as e:
+            print(f"⚠️ Cannot write logs to {log_dir} ({e}); logging to stdout only")
+            console = True
+        if console:
+            handlers.append(logging.StreamHandler(sys.stdout))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        # The request id must be read in the caller's context, so it is
+        # stamped before sampling and before the record crosses threads
+        _queue_handler.addFilter(RequestContextFilter())
+        _queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+
+        root = logging.getLogger("nestle")
+        root.setLevel(level)
+        root.addHandler(_queue_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _queue_handler
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        logging.getLogger("nestle").removeHandler(_queue_handler)
+        _listener = None
+        _queue_handler = None
+
+def dropped_records():
+    """Records dropped because the log queue was full"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
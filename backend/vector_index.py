@@ -0,0 +1,297 @@
+# backend/vector_index.py
+
+import json
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Which backend retrieval uses: "numpy" (exact) or "faiss" (exact or approximate)
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "numpy").lower()
+# FAISS index family: "flat" (exact inner product), "ivf" or "hnsw"
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "64"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+def normalize_rows(matrix):
+    """L2-normalize each row, leaving all-zero rows untouched"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def top_k_positions(scores, k):
+    """Indices of the k highest scores in descending order, via argpartition"""
+    n = scores.shape[-1]
+    if k >= n:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+def _as_query_matrix(query_embs):
+    matrix = np.asarray(query_embs, dtype=np.float32)
+    return matrix.reshape(1, -1) if matrix.ndim == 1 else matrix
+
+def _write_atomically(path, write):
+    """Write a file via a temporary name so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+class VectorIndex(ABC):
+    """
+    Inner-product index over L2-normalized vectors (so scores are cosine
+    similarities), with a parallel array of node ids. Backends implement
+    dim, build, add, search, save and load; one missing any of them cannot
+    be instantiated.
+    """
+
+    backend = None
+
+    def __init__(self, node_ids=()):
+        self.node_ids = np.asarray(list(node_ids), dtype=object)
+        self.meta = {}
+        self._positions = {node: i for i, node in enumerate(self.node_ids)}
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, node):
+        return node in self._positions
+
+    def position(self, node):
+        return self._positions[node]
+
+    def _append_ids(self, node_ids):
+        start = len(self.node_ids)
+        self.node_ids = np.concatenate([self.node_ids, np.asarray(list(node_ids), dtype=object)])
+        for i, node in enumerate(self.node_ids[start:], start):
+            self._positions[node] = i
+
+    @property
+    @abstractmethod
+    def dim(self):
+        """Vector dimension (0 while the index is empty)"""
+
+    @abstractmethod
+    def build(self, node_ids, vectors):
+        """Replace the contents of the index with raw (unnormalized) vectors"""
+
+    @abstractmethod
+    def add(self, node_ids, vectors):
+        """Append raw (unnormalized) vectors for new nodes"""
+
+    @abstractmethod
+    def search(self, query_embs, k):
+        """
+        Return (scores, positions), each shaped (n_queries, k), for
+        normalized query embeddings. Missing results have position -1.
+        """
+
+    @abstractmethod
+    def save(self, path, meta=None):
+        """Write the index to path with a JSON sidecar holding meta"""
+
+    @classmethod
+    @abstractmethod
+    def load(cls, path, meta):
+        """Open an index written by save, given its sidecar meta"""
+
+    def _sidecar(self, meta):
+        return {
+            **(meta or {}),
+            "backend": self.backend,
+            "shape": [len(self), self.dim],
+            "node_ids": [str(node) for node in self.node_ids],
+        }
+
+    def _write_sidecar(self, path, meta):
+        """Write <path>.json last, so a reader never sees metadata for data that is not there yet"""
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._sidecar(meta), f, ensure_ascii=False)
+        _write_atomically(f"{path}.json", write)
+
+class NumpyVectorIndex(VectorIndex):
+    """Exact search with one matrix product over a contiguous float32 matrix"""
+
+    backend = "numpy"
+
+    def __init__(self, node_ids=(), matrix=None):
+        super().__init__(node_ids)
+        if matrix is None:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def build(self, node_ids, vectors):
+        self.__init__(node_ids, normalize_rows(_as_query_matrix(vectors)))
+        return self
+
+    def add(self, node_ids, vectors):
+        vectors = normalize_rows(_as_query_matrix(vectors))
+        # A memory-mapped matrix is read-only, so adding always makes an in-memory copy
+        self.matrix = vectors if len(self) == 0 else np.ascontiguousarray(np.vstack([self.matrix, vectors]))
+        self._append_ids(node_ids)
+        return self
+
+    def vector(self, node):
+        """Return the normalized embedding for a node"""
+        return self.matrix[self._positions[node]]
+
+    def scores(self, query_embs):
+        """Cosine similarity of each query to every node, shaped (n_queries, n_nodes)"""
+        return _as_query_matrix(query_embs) @ self.matrix.T
+
+    def search(self, query_embs, k):
+        all_scores = self.scores(query_embs)
+        k = min(k, len(self))
+        positions = np.stack([top_k_positions(row, k) for row in all_scores]) if k else np.zeros((len(all_scores), 0), dtype=np.int64)
+        return np.take_along_axis(all_scores, positions, axis=1), positions
+
+    def save(self, path, meta=None):
+        """Write a raw float32 matrix (<path>.f32) plus a JSON sidecar (<path>.json)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _write_atomically(f"{path}.f32", lambda tmp_path: self.matrix.tofile(tmp_path))
+        self._write_sidecar(path, meta)
+
+    @classmethod
+    def load(cls, path, meta):
+        """
+        Open the matrix read-only with np.memmap, so every worker process maps
+        the same page-cached vectors instead of holding a copy
+        """
+        rows, dim = meta["shape"]
+        matrix = np.memmap(f"{path}.f32", dtype=np.float32, mode="r", shape=(rows, dim))
+        return cls(meta["node_ids"], matrix)
+
+class FaissVectorIndex(VectorIndex):
+    """FAISS inner-product index: exact (flat) or approximate (IVF, HNSW)"""
+
+    backend = "faiss"
+
+    def __init__(self, node_ids=(), index=None, index_type=FAISS_INDEX_TYPE, mapped_path=None):
+        super().__init__(node_ids)
+        self.index = index
+        self.index_type = index_type
+        # Set when the index is memory-mapped read-only from this file
+        self.mapped_path = mapped_path
+
+    @staticmethod
+    def _faiss():
+        # faiss-cpu is optional: only imported when this backend is selected
+        import faiss
+        return faiss
+
+    @property
+    def dim(self):
+        return self.index.d if self.index is not None else 0
+
+    def _new_index(self, dim, n_train):
+        faiss = self._faiss()
+        if self.index_type == "flat":
+            return faiss.IndexFlatIP(dim)
+        if self.index_type == "ivf":
+            # IVF needs at least one training point per list
+            nlist = max(1, min(FAISS_NLIST, n_train))
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = min(FAISS_NPROBE, nlist)
+            return index
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = FAISS_EF_SEARCH
+            return index
+        raise ValueError(f"Unknown FAISS index type: {self.index_type}")
+
+    def build(self, node_ids, vectors):
+        vectors = normalize_rows(_as_query_matrix(vectors))
+        index = self._new_index(vectors.shape[1], len(vectors))
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        self.__init__(node_ids, index, self.index_type)
+        return self
+
+    def add(self, node_ids, vectors):
+        if self.index is None:
+            return self.build(node_ids, vectors)
+        if self.mapped_path:
+            # Memory-mapped indexes are read-only; load a private copy to modify
+            self.index = self._configure(self._faiss().read_index(self.mapped_path), self.index_type)
+            self.mapped_path = None
+        self.index.add(normalize_rows(_as_query_matrix(vectors)))
+        self._append_ids(node_ids)
+        return self
+
+    def search(self, query_embs, k):
+        k = min(k, len(self))
+        queries = np.ascontiguousarray(_as_query_matrix(query_embs))
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty, empty.astype(np.int64)
+        return self.index.search(queries, k)
+
+    def save(self, path, meta=None):
+        """Write the FAISS index (<path>.faiss) plus a JSON sidecar (<path>.json)"""
+        faiss = self._faiss()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _write_atomically(f"{path}.faiss", lambda tmp_path: faiss.write_index(self.index, tmp_path))
+        self._write_sidecar(path, {**(meta or {}), "index_type": self.index_type})
+
+    @classmethod
+    def _configure(cls, index, index_type):
+        """Apply search-time parameters, which are not stored in the index file"""
+        if index_type == "ivf":
+            cls._faiss().extract_index_ivf(index).nprobe = FAISS_NPROBE
+        elif index_type == "hnsw":
+            index.hnsw.efSearch = FAISS_EF_SEARCH
+        return index
+
+    @classmethod
+    def load(cls, path, meta):
+        faiss = cls._faiss()
+        index_path = f"{path}.faiss"
+        index_type = meta.get("index_type", FAISS_INDEX_TYPE)
+        # Memory-map the vectors where the index type allows it, so workers share pages
+        try:
+            index, mapped_path = faiss.read_index(index_path, faiss.IO_FLAG_MMAP), index_path
+        except RuntimeError:
+            index, mapped_path = faiss.read_index(index_path), None
+        return cls(meta["node_ids"], cls._configure(index, index_type), index_type, mapped_path)
+
+INDEX_BACKENDS = {
+    NumpyVectorIndex.backend: NumpyVectorIndex,
+    FaissVectorIndex.backend: FaissVectorIndex,
+}
+
+def create_index(backend=None, **options):
+    """Empty index for the configured backend (VECTOR_INDEX_BACKEND unless given)"""
+    backend = (backend or VECTOR_INDEX_BACKEND).lower()
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown vector index backend: {backend}")
+    return INDEX_BACKENDS[backend](**options)
+
+def read_index_meta(path):
+    """Sidecar metadata for an index written by save(), or None if it is missing"""
+    meta_path = f"{path}.json"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_index(path, meta=None):
+    """Load an index written by save(), dispatching on the backend in its sidecar"""
+    meta = meta or read_index_meta(path)
+    if meta is None:
+        return None
+    # Indexes written before the backend field existed are raw numpy matrices
+    index = INDEX_BACKENDS[meta.get("backend", NumpyVectorIndex.backend)].load(path, meta)
+    index.meta = meta
+    return index
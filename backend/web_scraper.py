@@ -1,55 +1,144 @@
 # backend/web_scraper.py
 
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import threading
 import time
 import os
-from urllib.parse import quote
+from urllib.parse import quote, urlparse
 from dotenv import load_dotenv
 
+from backend.http_client import http_get, async_http_get, close_async_client
+from backend.search_cache import search_cache
+from backend.metrics import FALLBACKS
+from backend.structured_logging import get_logger, preview
+from backend.process_pool import compute_pool
+
 load_dotenv()
 
-def scrape_web(query: str, num_results=5):
+logger = get_logger("web_scraper")
+
+# DuckDuckGo HTML endpoint; point it at a local stand-in for offline benchmarks
+SEARCH_URL = os.getenv("SEARCH_URL", "https://duckduckgo.com/html/?q={query}")
+
+# Nestlé websites searched first, in priority order
+NESTLE_SITES = [
+    "madewithnestle.ca",
+    "nestle.com", 
+    "nestle.ca",
+    "corporate.nestle.ca"
+]
+
+# Searches one chat fans out to, all on the search host: one per site plus the general search
+SEARCH_FANOUT = len(NESTLE_SITES) + 1
+
+# Per-host rate limit shared by every request in this process. Every search
+# goes to the one search host, so uncached chats per second per worker are
+# capped at SEARCH_RATE_PER_HOST / SEARCH_FANOUT (1 with the defaults); the
+# burst lets two fan-outs start at once
+SEARCH_RATE_PER_HOST = float(os.getenv("SEARCH_RATE_PER_HOST", str(SEARCH_FANOUT)))
+SEARCH_BURST_PER_HOST = float(os.getenv("SEARCH_BURST_PER_HOST", str(2 * SEARCH_FANOUT)))
+
+# Overall budget (seconds) for one search fan-out; slower sites are dropped
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "5"))
+
+class TokenBucket:
     """
-    Enhanced web scraper focused on Nestlé-related content
+    Thread-safe token bucket. reserve() takes a token immediately and
+    returns how long the caller must wait before using it, so callers on
+    any thread or event loop queue fairly without holding a lock while waiting.
     """
-    headers = {
-        "User-Agent": os.getenv("USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-    }
-    
-    max_results = int(os.getenv("MAX_SEARCH_RESULTS", num_results))
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def refund(self):
+        """Give back a reserved token that will not be used (e.g. its wait was cancelled)"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    def wait(self):
+        """Block until a token is available"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """Wait for a token without blocking the event loop"""
+        delay = self.reserve()
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # A search dropped at its deadline never sends its request; without
+                # the refund every cancelled wait would push later searches back
+                self.refund()
+                raise
+
+_host_buckets = {}
+_host_buckets_lock = threading.Lock()
+
+def get_host_bucket(url):
+    """Token bucket for the host of url, created on first use"""
+    host = urlparse(url).netloc
+    with _host_buckets_lock:
+        bucket = _host_buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(SEARCH_RATE_PER_HOST, SEARCH_BURST_PER_HOST)
+            _host_buckets[host] = bucket
+        return bucket
+
+def wait_for_rate_limit(url):
+    """Block until the per-host rate limit allows a request to url"""
+    get_host_bucket(url).wait()
+
+def build_search_url(search_query):
+    """DuckDuckGo HTML search URL for a query"""
+    return SEARCH_URL.format(query=quote(search_query))
+
+def make_soup(html):
+    """Parse HTML with BeautifulSoup, imported on first use to keep startup light"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "html.parser")
+
+def parse_search_results(html, accept, num_results):
+    """Collect up to num_results DuckDuckGo result links for which accept(href) is true"""
+    soup = make_soup(html)
     results = []
     
-    print(f"🔍 Starting web search for: '{query}'")
-    
-    # 1. First try to search specifically on Nestlé websites
-    nestle_sites = [
-        "madewithnestle.ca",
-        "nestle.com", 
-        "nestle.ca",
-        "corporate.nestle.ca"
-    ]
-    
-    for site in nestle_sites:
-        try:
-            site_results = search_specific_site(query, site, headers, num_results=2)
-            results.extend(site_results)
-            if len(results) >= max_results:
+    # Look for DuckDuckGo result links
+    for link_elem in soup.find_all('a', class_='result__a'):
+        href = link_elem.get('href')
+        if href and accept(href):
+            results.append(href)
+            if len(results) >= num_results:
                 break
-            time.sleep(1)  # Be respectful to servers
-        except Exception as e:
-            print(f"⚠️ Error searching {site}: {e}")
-            continue
     
-    # 2. If we don't have enough results, do a general Nestlé-focused search
-    if len(results) < max_results:
-        try:
-            general_results = search_nestle_general(query, headers, max_results - len(results))
-            results.extend(general_results)
-        except Exception as e:
-            print(f"⚠️ Error in general search: {e}")
-    
-    # 3. Remove duplicates and return clean URLs
+    return results
+
+def parse_result_links(html, site, num_results):
+    """
+    parse_search_results for links on one site, or for any Nestlé link when
+    site is None. Takes plain arguments so compute pool children can run it.
+    """
+    accept = is_nestle_related if site is None else (lambda href: site in href)
+    return parse_search_results(html, accept, num_results)
+
+def clean_search_results(results, max_results):
+    """Remove duplicates and non-Nestlé links, returning clean URLs"""
     seen_urls = set()
     clean_results = []
     for result in results:
@@ -58,72 +147,155 @@ def scrape_web(query: str, num_results=5):
             seen_urls.add(url)
             clean_results.append(url)
     
-    print(f"✅ Found {len(clean_results)} unique Nestlé-related URLs")
     return clean_results[:max_results]
 
+def scrape_web(query: str, num_results=5):
+    """
+    Enhanced web scraper focused on Nestlé-related content.
+    Blocking wrapper around scrape_web_async for scripts and sync callers.
+    """
+    async def run():
+        try:
+            return await scrape_web_async(query, num_results)
+        finally:
+            # The pooled client belongs to this temporary event loop
+            await close_async_client()
+
+    return asyncio.run(run())
+
+async def scrape_web_async(query: str, num_results=5, deadline=None):
+    """
+    Search all Nestlé sites and the general Nestlé query concurrently.
+    Searches still running when the deadline expires are cancelled and
+    their results dropped rather than stalling the answer.
+    """
+    max_results = int(os.getenv("MAX_SEARCH_RESULTS", num_results))
+    deadline = SEARCH_DEADLINE if deadline is None else deadline
+    
+    cached = await search_cache.get_async(query, max_results)
+    if cached is not None:
+        logger.info("Search cache hit", extra={"query": preview(query), "results": len(cached)})
+        return cached
+    
+    logger.debug("Starting web search", extra={"query": preview(query)})
+    
+    # Site-specific searches first (in priority order), then the general search
+    tasks = [
+        asyncio.create_task(search_specific_site_async(query, site, num_results=2))
+        for site in NESTLE_SITES
+    ]
+    tasks.append(asyncio.create_task(search_nestle_general_async(query, max_results)))
+    
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning("Dropped searches that exceeded the deadline", extra={"dropped": len(pending), "deadline_s": deadline})
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    results = []
+    for task in tasks:
+        if task in done and not task.cancelled() and task.exception() is None:
+            results.extend(task.result())
+    
+    # Remove duplicates and return clean URLs
+    clean_results = clean_search_results(results, max_results)
+    
+    # Only cache complete, non-empty searches so a slow or failing site is retried next time
+    if clean_results and not pending:
+        await search_cache.set_async(query, max_results, clean_results)
+    
+    logger.info("Web search finished", extra={"results": len(clean_results)})
+    return clean_results
+
 def search_specific_site(query, site, headers, num_results=2):
     """Search within a specific Nestlé site"""
     try:
         # Use DuckDuckGo for site-specific search
-        search_query = f"site:{site} {query}"
-        encoded_query = quote(search_query)
-        search_url = f"https://duckduckgo.com/html/?q={encoded_query}"
+        search_url = build_search_url(f"site:{site} {query}")
         
-        print(f"🔍 Searching {site}...")
+        logger.debug("Searching site", extra={"site": site})
         
-        response = requests.get(search_url, headers=headers, timeout=10)
+        wait_for_rate_limit(search_url)
+        response = http_get(search_url, headers=headers)
         if response.status_code != 200:
-            print(f"❌ Failed to search {site}: Status {response.status_code}")
+            logger.warning("Site search failed", extra={"site": site, "status": response.status_code})
             return []
         
-        soup = BeautifulSoup(response.text, "html.parser")
-        results = []
+        results = parse_result_links(response.text, site, num_results)
         
-        # Look for DuckDuckGo result links
-        for link_elem in soup.find_all('a', class_='result__a'):
-            href = link_elem.get('href')
-            if href and site in href:
-                results.append(href)
-                if len(results) >= num_results:
-                    break
+        logger.debug("Site search finished", extra={"site": site, "results": len(results)})
+        return results
         
-        print(f"✅ Found {len(results)} results from {site}")
+    except Exception as e:
+        logger.warning("Error searching site", extra={"site": site, "error": str(e)})
+        return []
+
+async def search_specific_site_async(query, site, num_results=2):
+    """Search within a specific Nestlé site through the pooled async client"""
+    try:
+        search_url = build_search_url(f"site:{site} {query}")
+        
+        logger.debug("Searching site", extra={"site": site})
+        
+        # A token per attempt, retries included, so 429 retries are rate limited too
+        response = await async_http_get(search_url, bucket=get_host_bucket(search_url))
+        if response.status_code != 200:
+            logger.warning("Site search failed", extra={"site": site, "status": response.status_code})
+            return []
+        
+        results = await compute_pool.run(parse_result_links, response.text, site, num_results)
+        
+        logger.debug("Site search finished", extra={"site": site, "results": len(results)})
         return results
         
     except Exception as e:
-        print(f"❌ Error searching {site}: {e}")
+        logger.warning("Error searching site", extra={"site": site, "error": str(e)})
         return []
 
 def search_nestle_general(query, headers, num_results=3):
     """General search with Nestlé-specific terms"""
     try:
         # Add Nestlé-specific terms to the query
-        enhanced_query = f"Nestlé {query} site:nestle.com OR site:madewithnestle.ca"
-        encoded_query = quote(enhanced_query)
-        search_url = f"https://duckduckgo.com/html/?q={encoded_query}"
+        search_url = build_search_url(f"Nestlé {query} site:nestle.com OR site:madewithnestle.ca")
         
-        print(f"🔍 Performing general Nestlé search...")
+        logger.debug("Performing general Nestlé search")
         
-        response = requests.get(search_url, headers=headers, timeout=10)
+        wait_for_rate_limit(search_url)
+        response = http_get(search_url, headers=headers)
         if response.status_code != 200:
-            print(f"❌ General search failed: Status {response.status_code}")
+            logger.warning("General search failed", extra={"status": response.status_code})
             return []
         
-        soup = BeautifulSoup(response.text, "html.parser")
-        results = []
+        results = parse_result_links(response.text, None, num_results)
+        
+        logger.debug("General search finished", extra={"results": len(results)})
+        return results
+        
+    except Exception as e:
+        logger.warning("Error in general search", extra={"error": str(e)})
+        return []
+
+async def search_nestle_general_async(query, num_results=3):
+    """General Nestlé search through the pooled async client"""
+    try:
+        search_url = build_search_url(f"Nestlé {query} site:nestle.com OR site:madewithnestle.ca")
         
-        for link_elem in soup.find_all('a', class_='result__a'):
-            href = link_elem.get('href')
-            if href and is_nestle_related(href):
-                results.append(href)
-                if len(results) >= num_results:
-                    break
+        logger.debug("Performing general Nestlé search")
         
-        print(f"✅ Found {len(results)} results from general search")
+        # A token per attempt, retries included, so 429 retries are rate limited too
+        response = await async_http_get(search_url, bucket=get_host_bucket(search_url))
+        if response.status_code != 200:
+            logger.warning("General search failed", extra={"status": response.status_code})
+            return []
+        
+        results = await compute_pool.run(parse_result_links, response.text, None, num_results)
+        
+        logger.debug("General search finished", extra={"results": len(results)})
         return results
         
     except Exception as e:
-        print(f"❌ Error in general search: {e}")
+        logger.warning("Error in general search", extra={"error": str(e)})
         return []
 
 def extract_clean_url(url_string):
@@ -144,7 +316,7 @@ def extract_clean_url(url_string):
         
         return url_string
     except Exception as e:
-        print(f"⚠️ Error cleaning URL {url_string}: {e}")
+        logger.debug("Error cleaning URL", extra={"url": url_string, "error": str(e)})
         return None
 
 def is_nestle_related(url):
@@ -170,7 +342,8 @@ def get_fallback_nestle_urls(query):
     
     fallback_urls = []
     
-    print(f"🔄 Using fallback URLs for query: '{query}'")
+    logger.info("Using fallback URLs", extra={"query": preview(query)})
+    FALLBACKS.inc(kind="search_urls")
     
     if any(word in query_lower for word in ["product", "food", "chocolate", "coffee", "brand"]):
         fallback_urls.extend([
@@ -236,22 +409,16 @@ def get_fallback_nestle_urls(query):
             unique_urls.append(url)
             seen.add(url)
     
-    print(f"📋 Returning {len(unique_urls)} fallback URLs")
     return unique_urls[:3]
 
 def scrape_specific_url(url, headers=None):
     """Scrape content from a specific URL (for future enhancement)"""
-    if not headers:
-        headers = {
-            "User-Agent": os.getenv("USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
-        }
-    
     try:
-        print(f"🌐 Scraping content from: {url}")
-        response = requests.get(url, headers=headers, timeout=10)
+        logger.debug("Scraping content", extra={"url": url})
+        response = http_get(url, headers=headers)
         
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = make_soup(response.text)
             
             # Extract relevant text content
             content = []
@@ -272,9 +439,9 @@ def scrape_specific_url(url, headers=None):
             
             return "\n".join(content)
         else:
-            print(f"❌ Failed to scrape {url}: Status {response.status_code}")
+            logger.warning("Failed to scrape URL", extra={"url": url, "status": response.status_code})
             return None
             
     except Exception as e:
-        print(f"❌ Error scraping {url}: {e}")
+        logger.warning("Error scraping URL", extra={"url": url, "error": str(e)})
         return None
\ No newline at end of file
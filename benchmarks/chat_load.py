@@ -0,0 +1,238 @@
+# benchmarks/chat_load.py
+"""
+End-to-end /chat latency benchmark against local fake OpenAI and
+DuckDuckGo services (benchmarks/fake_services.py).
+
+Starts the fakes and the real app (uvicorn, in-process), waits for
+warm-up, then sends questions at a fixed concurrency. Reports p50/p95/p99
+latency, throughput and a per-stage breakdown taken from the Server-Timing
+header /chat returns, and writes everything as JSON for run-to-run diffs.
+
+    python -m benchmarks.chat_load --requests 200 --concurrency 16
+    python -m benchmarks.chat_load --llm-failure-rate 0.2 --search-latency-ms 2000 --output run.json
+    python -m benchmarks.chat_load --llm-slow-rate 0.05 --llm-slow-ms 5000 --hedge
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_services import add_fault_arguments, config_from_args, service_env, start_fake_services
+
+QUESTIONS = [
+    "Tell me about KitKat",
+    "What flavours of Smarties are there?",
+    "Is Aero chocolate made in Canada?",
+    "Which Coffee-mate creamers are dairy free?",
+    "What is the Nestlé Cocoa Plan?",
+    "Do you have hot chocolate recipes with Carnation?",
+    "What Gerber products are available for babies?",
+    "What Nestlé gifts are good for Christmas?",
+    "How does Nestlé approach sustainability?",
+    "What is Quality Street?",
+    "Tell me about Nespresso",
+    "What is Butterfinger made of?",
+]
+
+STAGES = ["embed", "cache", "retrieve", "search", "context", "llm", "total"]
+
+def free_port():
+    with contextlib.closing(socket.socket()) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def parse_server_timing(header):
+    """{stage: milliseconds} from a Server-Timing header"""
+    timings = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.startswith("dur="):
+            timings[name] = float(params[4:])
+    return timings
+
+def summarize(values):
+    if not values:
+        return None
+    values = np.asarray(values)
+    return {
+        "count": int(len(values)),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+    }
+
+def configure_environment(args, server):
+    """Point the app at the fakes; must run before the app modules are imported"""
+    os.environ.update(service_env(server))
+    # The benchmark measures the app, not politeness towards DuckDuckGo
+    os.environ["SEARCH_RATE_PER_HOST"] = str(args.search_rate)
+    os.environ["SEARCH_BURST_PER_HOST"] = str(max(args.search_rate, 1))
+    if args.azure:
+        # The fake also serves Azure's /openai/deployments/<name>/chat/completions
+        os.environ["AZURE_OPENAI_ENDPOINT"] = server.base_url
+    else:
+        os.environ.pop("AZURE_OPENAI_ENDPOINT", None)
+    os.environ["LLM_HEDGE_ENABLED"] = str(args.hedge).lower()
+    if not args.caches:
+        os.environ["SEARCH_CACHE_SIZE"] = "0"
+        os.environ["SEARCH_CACHE_PATH"] = ""
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+
+def start_app(port):
+    """Run app.app under uvicorn in a background thread, returning the server"""
+    import uvicorn
+    import app
+
+    server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("App server failed to start")
+        time.sleep(0.05)
+    server.thread = thread
+    return server
+
+async def wait_until_ready(client, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await client.get("/ready")
+        if response.status_code == 200:
+            return response.json()
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"App was not ready within {timeout}s")
+
+async def run_load(client, requests, concurrency, timeout):
+    """Send requests questions with at most concurrency in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one(i):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={"question": question}, timeout=timeout)
+                elapsed = (time.perf_counter() - start) * 1000
+                results.append({
+                    "ok": response.status_code == 200,
+                    "status": response.status_code,
+                    "latency_ms": elapsed,
+                    "stages": parse_server_timing(response.headers.get("server-timing")),
+                })
+            except Exception as e:
+                results.append({
+                    "ok": False,
+                    "status": type(e).__name__,
+                    "latency_ms": (time.perf_counter() - start) * 1000,
+                    "stages": {},
+                })
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return results, time.perf_counter() - start
+
+def build_report(args, results, wall_seconds, readiness, fake_stats):
+    ok = [r for r in results if r["ok"]]
+    errors = {}
+    for r in results:
+        if not r["ok"]:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+
+    stages = {}
+    for stage in STAGES:
+        stages[stage] = summarize([r["stages"][stage] for r in ok if stage in r["stages"]])
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": errors,
+        "wall_s": round(wall_seconds, 3),
+        "throughput_rps": round(len(ok) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency": summarize([r["latency_ms"] for r in ok]),
+        "stages": stages,
+        "startup_timings": readiness.get("startup_timings"),
+        "fake_services": fake_stats,
+    }
+
+def print_report(report):
+    latency = report["latency"] or {}
+    print(f"\n📊 {report['succeeded']}/{report['requests']} ok in {report['wall_s']}s "
+          f"({report['throughput_rps']} req/s), errors: {report['errors'] or 'none'}")
+    print(f"\n{'stage':<10} {'count':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("request", latency)] + [(stage, report["stages"][stage]) for stage in STAGES]
+    for name, summary in rows:
+        if summary:
+            print(f"{name:<10} {summary['count']:>6} {summary['mean_ms']:>9} {summary['p50_ms']:>9} "
+                  f"{summary['p95_ms']:>9} {summary['p99_ms']:>9}")
+    print(f"\n🧪 Fake services: {report['fake_services']}")
+
+async def benchmark(args, app_port, fakes):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", limits=limits) as client:
+        readiness = await wait_until_ready(client, args.ready_timeout)
+        if args.warmup:
+            await run_load(client, args.warmup, args.concurrency, args.timeout)
+            fakes.stats.reset()
+        return readiness, *await run_load(client, args.requests, args.concurrency, args.timeout)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=4, help="requests sent before measuring")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request client timeout (s)")
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--search-rate", type=float, default=1e6, help="SEARCH_RATE_PER_HOST for the run")
+    parser.add_argument("--caches", action="store_true", help="keep the search and answer caches enabled")
+    parser.add_argument("--azure", action="store_true", help="call the LLM through the Azure OpenAI path")
+    parser.add_argument("--hedge", action="store_true", help="hedge LLM calls slower than their p95")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    parser.add_argument("--output", help="write the JSON report to this path")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    # The app resolves graph/ and frontend/ relative to the repository root
+    os.chdir(ROOT)
+    fakes = start_fake_services(config_from_args(args))
+    configure_environment(args, fakes)
+    print(f"🧪 Fake services on {fakes.base_url}; {args.requests} requests at concurrency {args.concurrency}")
+
+    app_output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    app_port = free_port()
+    with app_output:
+        app_server = start_app(app_port)
+        try:
+            readiness, results, wall_seconds = asyncio.run(benchmark(args, app_port, fakes))
+        finally:
+            app_server.should_exit = True
+            app_server.thread.join(timeout=10)
+            fakes.shutdown()
+
+    report = build_report(args, results, wall_seconds, readiness, fakes.stats.snapshot())
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/embed_throughput.py
+"""
+Query-embedding throughput under concurrency: one model.encode per query
+on the thread pool (the old /chat path) against the micro-batching
+EmbeddingBatcher in backend.retriever.
+
+Each run keeps `concurrency` callers busy encoding questions and reports
+queries/s, p50/p95 latency and the mean batch size.
+
+    python -m benchmarks.embed_throughput --concurrency 1 8 32 --requests 512
+    python -m benchmarks.embed_throughput --max-batch 64 --wait-ms 5 --output embed.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.chat_load import QUESTIONS
+from backend.retriever import EmbeddingBatcher, get_model
+
+async def run(encode, requests, concurrency):
+    """Encode `requests` questions with `concurrency` callers; returns (latencies ms, wall s)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        # Vary the text so no layer can serve repeats from a cache
+        question = f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"
+        async with semaphore:
+            start = time.perf_counter()
+            await encode(question)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, time.perf_counter() - start
+
+def summarize(mode, concurrency, latencies, wall_seconds, batcher=None):
+    latencies = np.asarray(latencies)
+    result = {
+        "mode": mode,
+        "concurrency": concurrency,
+        "queries_per_s": round(len(latencies) / wall_seconds, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+    if batcher is not None:
+        result["mean_batch_size"] = batcher.stats()["mean_batch_size"]
+    return result
+
+async def benchmark(args, model):
+    results = []
+    for concurrency in args.concurrency:
+        latencies, wall = await run(lambda q: asyncio.to_thread(model.encode, q), args.requests, concurrency)
+        results.append(summarize("per-query", concurrency, latencies, wall))
+
+        batcher = EmbeddingBatcher(max_batch=args.max_batch, wait_ms=args.wait_ms)
+        latencies, wall = await run(batcher.encode_async, args.requests, concurrency)
+        results.append(summarize("batched", concurrency, latencies, wall, batcher))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=256, help="queries per run")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=3)
+    parser.add_argument("--output", help="write the JSON results to this path")
+    args = parser.parse_args()
+
+    model = get_model()
+    if model is None:
+        sys.exit("❌ Sentence transformer model not available")
+    # First calls pay for lazy initialisation; keep them out of the numbers
+    model.encode(QUESTIONS)
+
+    results = asyncio.run(benchmark(args, model))
+
+    print(f"\n{'mode':<10} {'conc':>5} {'q/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'batch':>6}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['concurrency']:>5} {r['queries_per_s']:>9} {r['p50_ms']:>9} "
+              f"{r['p95_ms']:>9} {r.get('mean_batch_size', ''):>6}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
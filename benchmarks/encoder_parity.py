@@ -0,0 +1,140 @@
+# benchmarks/encoder_parity.py
+"""
+Parity and speed of the ONNX encoders (fp32 and int8) against the PyTorch
+SentenceTransformer they were exported from.
+
+Parity: cosine similarity between each ONNX embedding and the PyTorch one
+for the same text, and agreement of the top-k graph nodes retrieved for
+each question. Speed: load time, single-query latency and batch
+throughput. Exits non-zero if any encoder falls below the tolerances.
+
+    python -m backend.onnx_encoder export
+    python -m benchmarks.encoder_parity
+    python -m benchmarks.encoder_parity --min-cosine-int8 0.98 --output parity.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.chat_load import QUESTIONS
+from backend.onnx_encoder import MODEL_NAME, ONNX_MODEL_DIR, OnnxSentenceEncoder
+from backend.vector_index import normalize_rows, top_k_positions
+
+def load_texts(db_path):
+    """Node descriptions from the graph store, if there is one, to embed alongside the questions"""
+    if not os.path.exists(db_path):
+        return []
+    import sqlite3
+    from contextlib import closing
+    with closing(sqlite3.connect(db_path)) as conn:
+        return [row[0] for row in conn.execute("SELECT description FROM nodes WHERE description != ''")]
+
+def timed_load(factory):
+    start = time.perf_counter()
+    encoder = factory()
+    return encoder, time.perf_counter() - start
+
+def measure_speed(encoder, queries, texts, repeats):
+    """Single-query p50/p95 latency (ms) and batch throughput (texts/s)"""
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            encoder.encode(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    encoder.encode(texts, batch_size=32)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "query_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "batch_texts_per_s": round(len(texts) / batch_seconds, 1),
+    }
+
+def measure_parity(reference, candidate, n_queries, k):
+    """
+    Cosine similarity per text against the reference embeddings, and the
+    mean overlap of the top-k texts retrieved for each query
+    """
+    cosines = np.sum(normalize_rows(reference) * normalize_rows(candidate), axis=1)
+    docs_ref, docs_new = normalize_rows(reference[n_queries:]), normalize_rows(candidate[n_queries:])
+    overlaps = []
+    if len(docs_ref) >= k:
+        for i in range(n_queries):
+            expected = set(top_k_positions(docs_ref @ normalize_rows(reference[i]), k))
+            found = set(top_k_positions(docs_new @ normalize_rows(candidate[i]), k))
+            overlaps.append(len(expected & found) / k)
+    return {
+        "min_cosine": round(float(cosines.min()), 5),
+        "mean_cosine": round(float(cosines.mean()), 5),
+        "max_abs_diff": round(float(np.abs(normalize_rows(reference) - normalize_rows(candidate)).max()), 5),
+        f"top{k}_overlap": round(float(np.mean(overlaps)), 3) if overlaps else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--graph-db", default=os.path.join(ROOT, "graph", "graph.db"))
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5, help="passes over the questions for latency")
+    parser.add_argument("--min-cosine-fp32", type=float, default=0.9999)
+    parser.add_argument("--min-cosine-int8", type=float, default=0.98)
+    parser.add_argument("--output", help="write the JSON results to this path")
+    args = parser.parse_args()
+
+    queries = list(QUESTIONS)
+    texts = queries + load_texts(args.graph_db)
+    print(f"🧪 Comparing encoders on {len(queries)} questions and {len(texts) - len(queries)} node descriptions")
+
+    from sentence_transformers import SentenceTransformer
+    torch_encoder, torch_load = timed_load(lambda: SentenceTransformer(args.model, device="cpu"))
+    reference = np.asarray(torch_encoder.encode(texts, batch_size=32), dtype=np.float32)
+
+    encoders = {"torch": (torch_encoder, torch_load, None)}
+    for name, quantized, min_cosine in (("onnx-fp32", False, args.min_cosine_fp32),
+                                        ("onnx-int8", True, args.min_cosine_int8)):
+        try:
+            encoder, load_seconds = timed_load(lambda: OnnxSentenceEncoder(args.model_dir, quantized))
+        except Exception as e:
+            print(f"⚠️ Skipping {name}: {e}")
+            continue
+        encoders[name] = (encoder, load_seconds, min_cosine)
+
+    results, failed = {}, []
+    for name, (encoder, load_seconds, min_cosine) in encoders.items():
+        encoder.encode(queries)  # first-call initialisation is not part of the numbers
+        result = {"load_s": round(load_seconds, 2), **measure_speed(encoder, queries, texts, args.repeats)}
+        if min_cosine is not None:
+            result.update(measure_parity(reference, np.asarray(encoder.encode(texts, batch_size=32)), len(queries), args.k))
+            result["passed"] = result["min_cosine"] >= min_cosine
+            if not result["passed"]:
+                failed.append(name)
+        results[name] = result
+
+    print(f"\n{'encoder':<10} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'min cos':>9} {'top-k':>6}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['load_s']:>7} {r['query_p50_ms']:>8} {r['query_p95_ms']:>8} {r['batch_texts_per_s']:>9} "
+              f"{r.get('min_cosine', ''):>9} {str(r.get(f'top{args.k}_overlap', '')):>6}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    if len(encoders) == 1:
+        sys.exit("❌ No ONNX export found; run: python -m backend.onnx_encoder export")
+    if failed:
+        sys.exit(f"❌ Below the cosine tolerance: {', '.join(failed)}")
+    print("\n✅ ONNX embeddings within tolerance of PyTorch")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# benchmarks/fake_services.py
+"""
+Local stand-ins for the OpenAI chat completions API and DuckDuckGo HTML
+search, with configurable latency and failure injection.
+
+One HTTP server answers both:
+
+    POST /v1/chat/completions                              OpenAI
+    POST /openai/deployments/<name>/chat/completions       Azure OpenAI
+    GET  /html/?q=<query>                                  DuckDuckGo HTML
+
+Point the app at it with OPENAI_API_BASE=http://127.0.0.1:<port>/v1 and
+SEARCH_URL=http://127.0.0.1:<port>/html/?q={query}, or run it standalone:
+
+    python -m benchmarks.fake_services --port 8900 --llm-latency-ms 800
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlparse
+
+SEARCH_PAGES = {
+    "madewithnestle.ca": ["kitkat", "smarties", "aero", "coffee-mate", "recipes", "quality-street"],
+    "nestle.com": ["brands", "sustainability", "nutrition", "cocoa-plan"],
+    "nestle.ca": ["en/brands", "en/about-us", "en/sustainability"],
+    "corporate.nestle.ca": ["en/ourcompany", "en/media"],
+}
+
+@dataclass
+class FaultProfile:
+    """Latency and failure behaviour of one fake service"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    failure_rate: float = 0.0
+    failure_status: int = 500
+    seed: int = None
+    # A slow tail: this share of requests takes slow_ms longer
+    slow_rate: float = 0.0
+    slow_ms: float = 0.0
+    _rng: random.Random = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    def delay(self):
+        """Sleep for the configured latency, uniformly jittered"""
+        seconds = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if self.slow_rate and self._rng.random() < self.slow_rate:
+            seconds += self.slow_ms / 1000
+        if seconds:
+            time.sleep(seconds)
+
+    def should_fail(self):
+        return self._rng.random() < self.failure_rate
+
+@dataclass
+class FakeServiceConfig:
+    llm: FaultProfile = field(default_factory=FaultProfile)
+    search: FaultProfile = field(default_factory=FaultProfile)
+    # Delay between streamed completion chunks
+    token_interval_ms: float = 10.0
+    answer_words: int = 60
+
+class FakeServiceStats:
+    """Request and failure counters per service, safe to update from handler threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, service, outcome):
+        with self._lock:
+            key = f"{service}_{outcome}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+def fake_answer(question, words):
+    """Deterministic filler answer of roughly `words` words mentioning the question"""
+    filler = ("Nestlé Canada offers a wide range of products made with care and quality "
+              "ingredients for families across the country").split()
+    body = [filler[i % len(filler)] for i in range(words)]
+    return f"Here is what I found about {question}: " + " ".join(body) + "."
+
+def fake_search_html(query, results=5):
+    """DuckDuckGo-style HTML result page with result__a links on Nestlé sites"""
+    sites = re.findall(r"site:(\S+)", query) or list(SEARCH_PAGES)
+    terms = re.sub(r"site:\S+|\bOR\b", "", query).split()
+    slug = quote("-".join(terms[:3]).lower())
+    links = []
+    for i in range(results):
+        site = sites[i % len(sites)]
+        pages = SEARCH_PAGES.get(site, ["home"])
+        url = f"https://www.{site}/{pages[i % len(pages)]}?ref={slug}"
+        links.append(f'<div class="result"><a class="result__a" href="{url}">{site} result {i + 1}</a></div>')
+    return "<html><body><div class=\"results\">" + "".join(links) + "</div></body></html>"
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Set on the server instance by start_fake_services
+    @property
+    def config(self):
+        return self.server.config
+
+    @property
+    def stats(self):
+        return self.server.stats
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (e.g. its deadline passed) before the reply
+            self.close_connection = True
+
+    def _fail(self, service, profile):
+        self.stats.record(service, "failed")
+        error = {"error": {"message": f"Injected {service} failure", "type": "server_error"}}
+        self._send(profile.failure_status, json.dumps(error))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.rstrip("/").endswith("/html"):
+            self._send(404, json.dumps({"error": "not found"}))
+            return
+
+        profile = self.config.search
+        profile.delay()
+        if profile.should_fail():
+            self._fail("search", profile)
+            return
+        query = parse_qs(url.query).get("q", [""])[0]
+        self.stats.record("search", "ok")
+        self._send(200, fake_search_html(query), "text/html; charset=utf-8")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if not url.path.endswith("/chat/completions"):
+            self._send(404, json.dumps({"error": "not found"}))
+            return
+
+        profile = self.config.llm
+        profile.delay()
+        if profile.should_fail():
+            self._fail("llm", profile)
+            return
+
+        messages = payload.get("messages") or [{}]
+        question = messages[-1].get("content", "").split("\n")[0].replace("Question: ", "")
+        answer = fake_answer(question, self.config.answer_words)
+        model = payload.get("model") or url.path.split("/deployments/")[-1].split("/")[0]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        self.stats.record("llm", "ok")
+
+        if payload.get("stream"):
+            self._stream_completion(completion_id, model, answer)
+            return
+
+        self._send(200, json.dumps({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(answer.split()), "total_tokens": 0}
+        }))
+
+    def _stream_completion(self, completion_id, model, answer):
+        """Server-sent events in the OpenAI streaming format, one word per chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant"})
+        for i, word in enumerate(answer.split(" ")):
+            time.sleep(self.config.token_interval_ms / 1000)
+            event({"content": word if i == 0 else " " + word})
+        event({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def start_fake_services(config=None, host="127.0.0.1", port=0):
+    """
+    Serve the fakes from a background thread. Returns the server; its
+    base_url attribute is http://host:port and shutdown() stops it.
+    """
+    server = ThreadingHTTPServer((host, port), FakeServiceHandler)
+    server.daemon_threads = True
+    server.config = config or FakeServiceConfig()
+    server.stats = FakeServiceStats()
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def service_env(server):
+    """
+    Environment variables that point the app at a running fake server (for
+    the Azure path, set AZURE_OPENAI_ENDPOINT to its base_url as well)
+    """
+    return {
+        "OPENAI_API_BASE": f"{server.base_url}/v1",
+        "OPENAI_API_KEY": "fake-benchmark-key",
+        "SEARCH_URL": f"{server.base_url}/html/?q={{query}}",
+    }
+
+def add_fault_arguments(parser):
+    """Command-line options for the latency and failure of both services"""
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-failure-status", type=int, default=500)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="share of LLM calls in the slow tail")
+    parser.add_argument("--llm-slow-ms", type=float, default=0.0, help="extra latency of the slow tail")
+    parser.add_argument("--search-latency-ms", type=float, default=300)
+    parser.add_argument("--search-jitter-ms", type=float, default=100)
+    parser.add_argument("--search-failure-rate", type=float, default=0.0)
+    parser.add_argument("--search-failure-status", type=int, default=503)
+    parser.add_argument("--token-interval-ms", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+
+def config_from_args(args):
+    return FakeServiceConfig(
+        llm=FaultProfile(args.llm_latency_ms, args.llm_jitter_ms, args.llm_failure_rate,
+                         args.llm_failure_status, args.seed, args.llm_slow_rate, args.llm_slow_ms),
+        search=FaultProfile(args.search_latency_ms, args.search_jitter_ms, args.search_failure_rate,
+                            args.search_failure_status, args.seed + 1),
+        token_interval_ms=args.token_interval_ms,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_fake_services(config_from_args(args), args.host, args.port)
+    print(f"🧪 Fake OpenAI and DuckDuckGo serving on {server.base_url}")
+    for name, value in service_env(server).items():
+        print(f"   {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n📊 {server.stats.snapshot()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmarks/index_recall.py
+"""
+Recall-vs-latency comparison of the vector index backends.
+
+Exact NumPy search is the ground truth; each FAISS configuration is scored
+by recall@k against it, alongside build time and per-query search latency.
+
+    python -m benchmarks.index_recall --nodes 20000 --queries 500 --k 5
+    python -m benchmarks.index_recall --from-store graph/graph.db
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import vector_index
+from backend.vector_index import NumpyVectorIndex, FaissVectorIndex, normalize_rows
+
+def synthetic_vectors(n, dim, clusters, seed):
+    """Clustered unit vectors, closer to real sentence embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=n)
+    return normalize_rows(centers[labels] + 0.6 * rng.normal(size=(n, dim)))
+
+def store_vectors(path):
+    """Every cached node embedding in a graph store database"""
+    with closing(sqlite3.connect(path)) as conn:
+        blobs = [blob for (blob,) in conn.execute("SELECT vector FROM embeddings")]
+    return normalize_rows(np.stack([np.frombuffer(blob, dtype=np.float32) for blob in blobs]))
+
+def make_queries(vectors, n, seed):
+    """Perturbed copies of stored vectors, so every query has true neighbours"""
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.integers(0, len(vectors), size=n)]
+    return normalize_rows(picks + 0.3 * rng.normal(size=picks.shape) / np.sqrt(vectors.shape[1]))
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def measure(name, make_index, vectors, queries, k, truth):
+    node_ids = [f"node-{i}" for i in range(len(vectors))]
+
+    start = time.perf_counter()
+    index = make_index().build(node_ids, vectors)
+    build_seconds = time.perf_counter() - start
+
+    # One query at a time, as /chat does
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    _, positions = index.search(queries, k)
+    batch_seconds = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "index": name,
+        "build_s": round(build_seconds, 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 4),
+        "batch_qps": round(len(queries) / batch_seconds, 1),
+        "recall": 1.0 if truth is None else round(recall_at_k(positions, truth), 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--from-store", help="use the node embeddings cached in a graph.db instead of synthetic data")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.from_store:
+        vectors = store_vectors(args.from_store)
+    else:
+        vectors = synthetic_vectors(args.nodes, args.dim, args.clusters, args.seed)
+    queries = make_queries(vectors, args.queries, args.seed)
+    print(f"📊 {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}")
+
+    exact = NumpyVectorIndex().build(range(len(vectors)), vectors)
+    _, truth = exact.search(queries, args.k)
+
+    configs = [("numpy exact", NumpyVectorIndex)]
+    if importlib.util.find_spec("faiss") is not None:
+        configs += [
+            ("faiss flat", lambda: FaissVectorIndex(index_type="flat")),
+            (f"faiss ivf nlist={vector_index.FAISS_NLIST} nprobe={vector_index.FAISS_NPROBE}",
+             lambda: FaissVectorIndex(index_type="ivf")),
+            (f"faiss hnsw M={vector_index.FAISS_HNSW_M} ef={vector_index.FAISS_EF_SEARCH}",
+             lambda: FaissVectorIndex(index_type="hnsw")),
+        ]
+    else:
+        print("⚠️ faiss not installed; only the NumPy backend will be measured")
+
+    results = [
+        measure(name, make_index, vectors, queries, args.k, None if name == "numpy exact" else truth)
+        for name, make_index in configs
+    ]
+
+    print(f"\n{'index':<36} {'build s':>9} {'p50 ms':>9} {'p95 ms':>9} {'batch q/s':>11} {'recall':>8}")
+    for r in results:
+        print(f"{r['index']:<36} {r['build_s']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['batch_qps']:>11} {r['recall']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
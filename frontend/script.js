@@ -93,20 +93,23 @@ class NestleChatbot {
     this.showTyping();
     
     try {
-      // Send request to backend
-      const response = await fetch('/chat', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ question: message })
-      });
-      
-      const data = await response.json();
-      
-      // Hide typing indicator
-      this.hideTyping();
-      
-      // Add bot response
-      this.addBotMessage(data.answer, data.sources);
+      // Prefer the streaming endpoint so the answer renders as it is generated
+      const streamed = await this.streamMessage(message);
+      if (!streamed) {
+        const response = await fetch('/chat', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ question: message })
+        });
+        
+        const data = await response.json();
+        
+        // Hide typing indicator
+        this.hideTyping();
+        
+        // Add bot response
+        this.addBotMessage(data.answer, data.sources);
+      }
       
     } catch (error) {
       console.error('Error:', error);
@@ -115,6 +118,80 @@ class NestleChatbot {
     }
   }
   
+  async streamMessage(message) {
+    // Reads newline-delimited JSON events from /chat/stream: "sources" first,
+    // then "token" deltas, then "done". Returns false if streaming is unavailable.
+    const response = await fetch('/chat/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ question: message })
+    });
+    
+    if (!response.ok || !response.body || !window.TextDecoder) {
+      return false;
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let sources = [];
+    let messageDiv = null;
+    let renderPending = false;
+    
+    const render = () => {
+      renderPending = false;
+      this.renderBotMessage(messageDiv, text, sources);
+      this.scrollToBottom();
+    };
+    
+    const handleEvent = (event) => {
+      if (event.type === 'sources') {
+        sources = event.sources || [];
+      } else if (event.type === 'token') {
+        if (!messageDiv) {
+          this.hideTyping();
+          // Keep the send button disabled until the stream finishes
+          this.isTyping = true;
+          this.sendButton.disabled = true;
+          messageDiv = document.createElement('div');
+          messageDiv.className = 'message bot';
+          this.chatMessages.appendChild(messageDiv);
+        }
+        text += event.content;
+        // Re-render at most once per animation frame
+        if (!renderPending) {
+          renderPending = true;
+          requestAnimationFrame(render);
+        }
+      }
+    };
+    
+    try {
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+      }
+      if (buffer.trim()) {
+        handleEvent(JSON.parse(buffer));
+      }
+    } finally {
+      this.hideTyping();
+    }
+    
+    if (!messageDiv) {
+      this.addBotMessage('Sorry, I encountered an error. Please try again later.', sources);
+    } else {
+      render();
+    }
+    return true;
+  }
+  
   addMessage(text, sender) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${sender}`;
@@ -133,6 +210,12 @@ class NestleChatbot {
     const messageDiv = document.createElement('div');
     messageDiv.className = 'message bot';
     
+    this.renderBotMessage(messageDiv, text, sources);
+    this.chatMessages.appendChild(messageDiv);
+    this.scrollToBottom();
+  }
+  
+  renderBotMessage(messageDiv, text, sources) {
     // Format the text with proper line breaks and structure
     const formattedText = this.formatBotResponse(text);
     let html = `<strong>Nestlé Assistant:</strong> ${formattedText}`;
@@ -174,8 +257,6 @@ class NestleChatbot {
     }
     
     messageDiv.innerHTML = html;
-    this.chatMessages.appendChild(messageDiv);
-    this.scrollToBottom();
   }
   
   formatBotResponse(text) {
@@ -14,13 +14,22 @@ mkdir -p logs
 
 # Build the knowledge graph if it doesn't exist
 echo "🏗️ Checking for knowledge graph..."
-if [ ! -f "graph/graph.pkl" ]; then
+if [ ! -f "graph/graph.db" ] && [ ! -f "graph/graph.pkl" ]; then
     echo "📊 Building knowledge graph..."
     python -c "from backend.graph_builder import build_graph; build_graph()"
 else
     echo "✅ Knowledge graph already exists"
 fi
 
+# Write the shared embedding index once so gunicorn workers can memory-map it
+echo "🧮 Checking node embedding index..."
+python -c "from backend.retriever import load_graph, load_node_index, build_node_index; G = load_graph(); load_node_index(G) or build_node_index(G)"
+
+# Cache the prompt tokenizer's encoding so workers never download it at runtime
+echo "🔤 Caching prompt tokenizer..."
+export TIKTOKEN_CACHE_DIR=${TIKTOKEN_CACHE_DIR:-graph/tiktoken}
+python -c "from backend.context_builder import load_encoding; load_encoding()"
+
 # Set proper permissions
 echo "🔒 Setting permissions..."
 chmod +x app.py